@@ -0,0 +1,549 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# in-process stand-in for the parts of bpy the add-on uses. the add-on functions run unmodified on it
+# so microbenchmarks and regression checks run in plain CPython (numpy required, no Blender)
+#
+#   import fake_bpy
+#   sn = fake_bpy.load_addon()
+#   ob = fake_bpy.set_active(fake_bpy.grid_mesh(100, 100))
+#   sn.smooth_selected_normals(ob.data)
+#
+# python dev/fake_bpy.py --size 300 runs the microbenchmarks
+import sys
+import os
+import copy
+import types
+import contextlib
+import time
+import argparse
+import importlib.util
+import numpy as np
+
+ADDON_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "smooth-normal-420.py")
+
+#----------------------------------------------------------mesh-----------------------------------------------------
+# mathutils.Vector. vectors read from elements are copies, as in Blender
+class Vector(np.ndarray):
+    def __new__(cls, values=(0.0, 0.0, 0.0)):
+        return np.array(values, dtype=np.float32).view(cls)
+
+    @property
+    def length(self):
+        return float(np.sqrt(np.dot(self, self)))
+
+    def normalize(self):
+        length = self.length
+        if length > 0.0:
+            self /= length
+
+    def normalized(self):
+        v = Vector(self)
+        v.normalize()
+        return v
+
+# one element of a collection. attributes read and write the arrays of the collection
+class Element:
+    def __init__(self, collection, index):
+        object.__setattr__(self, "_collection", collection)
+        object.__setattr__(self, "index", index)
+
+    def __getattr__(self, name):
+        arrays = self._collection.arrays
+        if name not in arrays:
+            raise AttributeError(name)
+        value = arrays[name][self.index]
+        if np.ndim(value) == 0:
+            return value.item()
+        return Vector(value) if value.dtype.kind == 'f' else tuple(value.tolist())
+
+    def __setattr__(self, name, value):
+        self._collection.arrays[name][self.index] = value
+
+# bpy_prop_collection with foreach_get/foreach_set over named arrays
+class Collection:
+    def __init__(self, count, **arrays):
+        self.count = count
+        self.arrays = arrays
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError(index)
+        return Element(self, index)
+
+    def __iter__(self):
+        return (Element(self, i) for i in range(self.count))
+
+    def foreach_get(self, name, buffer):
+        np.copyto(np.asarray(buffer).reshape(-1), self.arrays[name].reshape(-1), casting='unsafe')
+
+    def foreach_set(self, name, buffer):
+        array = self.arrays[name]
+        array[...] = np.asarray(buffer).reshape(array.shape)
+
+# data.attributes, data.color_attributes and data.uv_layers
+class Layers(dict):
+    def __init__(self, mesh):
+        super().__init__()
+        self.mesh = mesh
+        self.active = None
+
+    def get(self, name, default=None):
+        return dict.get(self, name, default)
+
+    def remove(self, layer):
+        del self[layer.name]
+
+class Attribute:
+    def __init__(self, name, domain, data_type, data):
+        self.name = name
+        self.domain = domain
+        self.data_type = data_type
+        self.data = data
+
+class ColorAttributes(Layers):
+    def new(self, name, data_type, domain):
+        count = len(self.mesh.loops) if domain == 'CORNER' else len(self.mesh.vertices)
+        self[name] = Attribute(name, domain, data_type, Collection(count, color=np.ones((count, 4), dtype=np.float32)))
+        return self[name]
+
+class UVLayers(Layers):
+    def new(self, name, uv):
+        self[name] = Attribute(name, 'CORNER', 'FLOAT2', Collection(len(self.mesh.loops), uv=np.array(uv, dtype=np.float32).reshape(-1, 2)))
+        if self.active == None:
+            self.active = self[name]
+        return self[name]
+
+def normalize(vectors):
+    lengths = np.linalg.norm(vectors, axis=1)[:, None]
+    return np.divide(vectors, lengths, out=np.zeros_like(vectors), where=lengths > 0)
+
+# polygon mesh with custom normals. geometry is fixed, normals follow the Blender rules:
+# area weighted vertex normals, face normals on flat faces and custom normals when set
+class Mesh:
+    def __init__(self, co, polygons, name="Mesh"):
+        co = np.array(co, dtype=np.float32).reshape(-1, 3)
+        loop_vertex = np.array([v for p in polygons for v in p], dtype=np.int32)
+        totals = np.array([len(p) for p in polygons], dtype=np.int32)
+        starts = (np.cumsum(totals) - totals).astype(np.int32)
+        nxt = np.arange(len(loop_vertex)) + 1
+        nxt[starts + totals - 1] = starts
+        pairs = np.sort(np.stack((loop_vertex, loop_vertex[nxt]), axis=1), axis=1)
+        edges, loop_edge = np.unique(pairs, axis=0, return_inverse=True)
+
+        V, E, L, P = len(co), len(edges), len(loop_vertex), len(polygons)
+        self.name = name
+        self.vertices = Collection(V, co=co, normal=np.zeros((V, 3), dtype=np.float32), select=np.ones(V, dtype=bool), hide=np.zeros(V, dtype=bool))
+        self.edges = Collection(E, vertices=edges.astype(np.int32), select=np.ones(E, dtype=bool), use_edge_sharp=np.zeros(E, dtype=bool), hide=np.zeros(E, dtype=bool))
+        self.loops = Collection(L, vertex_index=loop_vertex, edge_index=loop_edge.reshape(-1).astype(np.int32), normal=np.zeros((L, 3), dtype=np.float32))
+        self.polygons = Collection(P, loop_start=starts, loop_total=totals, select=np.ones(P, dtype=bool), normal=np.zeros((P, 3), dtype=np.float32),
+            use_smooth=np.ones(P, dtype=bool), material_index=np.zeros(P, dtype=np.int32), hide=np.zeros(P, dtype=bool))
+        self.corner_normals = Collection(L, vector=self.loops.arrays["normal"])
+        self.attributes = Layers(self)
+        self.color_attributes = ColorAttributes(self)
+        self.uv_layers = UVLayers(self)
+        self.custom = None
+        self.calc_count = 0
+        self.write_count = 0
+        self.update()
+
+    @property
+    def has_custom_normals(self):
+        return self.custom is not None
+
+    def as_pointer(self):
+        return id(self)
+
+    # twice the area times the normal of each polygon (Newell's method)
+    def get_polygon_area_vectors(self):
+        co = self.vertices.arrays["co"].astype(np.float64)
+        loop_vertex = self.loops.arrays["vertex_index"]
+        starts = self.polygons.arrays["loop_start"]
+        totals = self.polygons.arrays["loop_total"]
+        nxt = np.arange(len(loop_vertex)) + 1
+        nxt[starts + totals - 1] = starts
+        cross = np.cross(co[loop_vertex], co[loop_vertex[nxt]])
+        return np.add.reduceat(cross, starts, axis=0) if len(starts) else np.zeros((0, 3))
+
+    # corners of the same vertex joined across edges that are not sharp and lie between two smooth faces
+    # returns the smallest corner of each fan
+    def get_smooth_fans(self):
+        loop_vertex = self.loops.arrays["vertex_index"]
+        loop_edge = self.loops.arrays["edge_index"]
+        starts = self.polygons.arrays["loop_start"]
+        totals = self.polygons.arrays["loop_total"]
+        polygon = np.repeat(np.arange(len(starts)), totals)
+        prev = np.arange(len(loop_vertex)) - 1
+        prev[starts] = starts + totals - 1
+
+        # each corner touches the edge to the next vertex and the edge from the previous one
+        corner = np.concatenate((np.arange(len(loop_vertex)), np.arange(len(loop_vertex))))
+        edge = np.concatenate((loop_edge, loop_edge[prev]))
+        keys = edge.astype(np.int64)*len(self.vertices) + loop_vertex[corner]
+        order = np.argsort(keys, kind='stable')
+        keys, corner, edge = keys[order], corner[order], edge[order]
+        # manifold edges only: exactly two corners per (edge, vertex)
+        counts = np.bincount(np.unique(keys, return_inverse=True)[1].ravel())
+        first = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        pairs = first[counts == 2]
+        a, b = corner[pairs], corner[pairs+1]
+        joined = ~self.edges.arrays["use_edge_sharp"][edge[pairs]] & self.polygons.arrays["use_smooth"][polygon[a]] & self.polygons.arrays["use_smooth"][polygon[b]]
+
+        parent = list(range(len(loop_vertex)))
+        def find(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+        for i, j in zip(a[joined].tolist(), b[joined].tolist()):
+            i, j = find(i), find(j)
+            if i != j:
+                parent[max(i, j)] = min(i, j)
+        return np.array([find(i) for i in range(len(loop_vertex))], dtype=np.int64)
+
+    # vertex normals, face normals on flat faces and area weighted fan normals around sharp edges
+    def get_default_loop_normals(self):
+        loop_vertex = self.loops.arrays["vertex_index"]
+        normals = self.vertices.arrays["normal"][loop_vertex].copy()
+        totals = self.polygons.arrays["loop_total"]
+        polygon = np.repeat(np.arange(len(self.polygons)), totals)
+        if self.edges.arrays["use_edge_sharp"].any():
+            fans = self.get_smooth_fans()
+            area = self.get_polygon_area_vectors()[polygon]
+            summed = np.stack([np.bincount(fans, area[:, i], minlength=len(loop_vertex)) for i in range(3)], axis=1)
+            normals = normalize(summed[fans]).astype(np.float32)
+        flat = np.repeat(~self.polygons.arrays["use_smooth"], totals)
+        normals[flat] = self.polygons.arrays["normal"][polygon[flat]]
+        return normals
+
+    # recalculate the normals after the positions or the custom normals changed
+    def update(self):
+        area = self.get_polygon_area_vectors()
+        self.polygons.arrays["normal"][:] = normalize(area)
+        loop_area = np.repeat(area, self.polygons.arrays["loop_total"], axis=0)
+        loop_vertex = self.loops.arrays["vertex_index"]
+        vnormals = np.stack([np.bincount(loop_vertex, loop_area[:, i], minlength=len(self.vertices)) for i in range(3)], axis=1)
+        self.vertices.arrays["normal"][:] = normalize(vnormals)
+        normals = self.get_default_loop_normals()
+        if self.custom is not None:
+            has_custom = np.linalg.norm(self.custom, axis=1) > 0
+            normals[has_custom] = self.custom[has_custom]
+        self.loops.arrays["normal"][:] = normals
+
+    def calc_normals_split(self):
+        self.calc_count += 1
+        self.update()
+
+    # zero vectors keep the default normal, as in Blender
+    def normals_split_custom_set(self, normals):
+        self.custom = normalize(np.array(normals, dtype=np.float64).reshape(-1, 3)).astype(np.float32)
+        self.write_count += 1
+        self.update()
+
+    def normals_split_custom_set_from_vertices(self, normals):
+        vnormals = normalize(np.array(normals, dtype=np.float64).reshape(-1, 3)).astype(np.float32)
+        self.custom = vnormals[self.loops.arrays["vertex_index"]]
+        self.write_count += 1
+        self.update()
+
+    # corner_normals keeps sharing the loop normals of the copy
+    def copy(self):
+        return copy.deepcopy(self)
+
+    def clear_custom_normals(self):
+        self.custom = None
+        self.update()
+
+    def calc_loop_triangles(self):
+        starts = self.polygons.arrays["loop_start"]
+        totals = self.polygons.arrays["loop_total"]
+        fans = [(s, s+i, s+i+1) for s, t in zip(starts.tolist(), totals.tolist()) for i in range(1, t-1)]
+        self.loop_triangles = Collection(len(fans), loops=np.array(fans, dtype=np.int32).reshape(-1, 3))
+
+    # one tangent per polygon from the uv gradient of its first triangle. not MikkTSpace, but orthogonal
+    # to the same normals, which is what the add-on needs
+    def calc_tangents(self, uvmap=""):
+        if (self.polygons.arrays["loop_total"] > 4).any():
+            raise RuntimeError("Tangent space can only be computed for tris/quads")
+        uv = self.uv_layers[uvmap].data.arrays["uv"] if uvmap else self.uv_layers.active.data.arrays["uv"]
+        co = self.vertices.arrays["co"][self.loops.arrays["vertex_index"]]
+        s = self.polygons.arrays["loop_start"]
+        e1, e2 = co[s+1] - co[s], co[s+2] - co[s]
+        d1, d2 = uv[s+1] - uv[s], uv[s+2] - uv[s]
+        det = d1[:, 0]*d2[:, 1] - d2[:, 0]*d1[:, 1]
+        det = np.where(np.abs(det) > 1e-12, det, 1.0)[:, None]
+        tangent = normalize((e1*d2[:, 1:2] - e2*d1[:, 1:2]) / det)
+        bitangent = (e2*d1[:, 0:1] - e1*d2[:, 0:1]) / det
+        sign = np.where(np.einsum('ij,ij->i', np.cross(self.polygons.arrays["normal"], tangent), bitangent) < 0.0, -1.0, 1.0)
+        totals = self.polygons.arrays["loop_total"]
+        self.loops.arrays["tangent"] = np.repeat(tangent, totals, axis=0).astype(np.float32)
+        self.loops.arrays["bitangent_sign"] = np.repeat(sign, totals).astype(np.float32)
+
+    def free_tangents(self):
+        self.loops.arrays.pop("tangent", None)
+        self.loops.arrays.pop("bitangent_sign", None)
+
+class Meshes(dict):
+    def remove(self, mesh):
+        self.pop(mesh.name, None)
+
+class VertexGroups(dict):
+    def get(self, name, default=None):
+        return dict.get(self, name, default)
+
+class Object:
+    def __init__(self, data, name="", mode='EDIT'):
+        self.name = name or data.name
+        self.data = data
+        self.type = 'MESH'
+        self.mode = mode
+        self.matrix_world = np.eye(4)
+        self.vertex_groups = VertexGroups()
+        self.select = True
+        # ob["key"] custom properties, as on an ID
+        self.properties = {}
+
+    def select_get(self):
+        return self.select
+
+    def __getitem__(self, key):
+        return self.properties[key]
+
+    def __setitem__(self, key, value):
+        self.properties[key] = value
+
+    def __delitem__(self, key):
+        del self.properties[key]
+
+    def __contains__(self, key):
+        return key in self.properties
+
+    def get(self, key, default=None):
+        return self.properties.get(key, default)
+
+# nx*ny quads on the XY plane with random heights. ngon adds one pentagon, loose adds unconnected vertices
+def grid_mesh(nx, ny, noise=0.1, seed=0, ngon=False, loose=0, name="Grid"):
+    rng = np.random.default_rng(seed)
+    x, y = np.meshgrid(np.arange(nx+1, dtype=np.float32), np.arange(ny+1, dtype=np.float32), indexing='ij')
+    co = np.stack((x.ravel(), y.ravel(), rng.random(x.size, dtype=np.float32)*noise), axis=1)
+    vid = np.arange(x.size).reshape(nx+1, ny+1)
+    quads = np.stack((vid[:-1, :-1], vid[1:, :-1], vid[1:, 1:], vid[:-1, 1:]), axis=-1).reshape(-1, 4).tolist()
+    extra = []
+    if ngon:
+        # a pentagon outside the grid sharing its first border edge
+        base = len(co)
+        extra = [(0.0, -1.0, 0.0), (1.0, -1.5, 0.0), (2.0, -1.0, 0.0)]
+        quads.append([int(vid[1, 0]), int(vid[0, 0]), base, base+1, base+2])
+    if loose:
+        extra += [(float(i), -5.0, 1.0) for i in range(loose)]
+    if extra:
+        co = np.concatenate((co, np.array(extra, dtype=np.float32)))
+    return Mesh(co, quads, name)
+
+#----------------------------------------------------------bpy-----------------------------------------------------
+# a property declaration. the scene property group gets its default
+class Property:
+    def __init__(self, kind, **options):
+        self.kind = kind
+        self.options = options
+
+    def default(self):
+        if "default" in self.options:
+            return self.options["default"]
+        if self.kind == 'EnumProperty':
+            items = self.options.get("items")
+            return items[0][0] if isinstance(items, (list, tuple)) and items else ""
+        if self.kind in ('FloatVectorProperty', 'IntVectorProperty', 'BoolVectorProperty'):
+            return (0,)*self.options.get("size", 3)
+        return {'FloatProperty': 0.0, 'IntProperty': 0, 'BoolProperty': False, 'StringProperty': "", 'CollectionProperty': []}.get(self.kind)
+
+PROPERTY_KINDS = ('BoolProperty', 'BoolVectorProperty', 'IntProperty', 'IntVectorProperty', 'FloatProperty', 'FloatVectorProperty',
+    'StringProperty', 'EnumProperty', 'PointerProperty', 'CollectionProperty')
+
+def create_property_group(cls):
+    group = types.SimpleNamespace()
+    for name, prop in getattr(cls, "__annotations__", {}).items():
+        if isinstance(prop, Property):
+            setattr(group, name, prop.default())
+    return group
+
+# bpy.types returns a placeholder class for any name not declared here
+class TypesModule(types.ModuleType):
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        cls = type(name, (), {})
+        setattr(self, name, cls)
+        return cls
+
+class Depsgraph:
+    def update(self):
+        ob = bpy.context.view_layer.objects.active
+        if ob != None:
+            ob.data.update()
+
+def mode_set(mode='OBJECT'):
+    ob = bpy.context.view_layer.objects.active
+    if ob != None:
+        ob.mode = mode
+    return {'FINISHED'}
+
+def customdata_custom_splitnormals_clear():
+    (bpy.context.object or bpy.context.view_layer.objects.active).data.clear_custom_normals()
+    return {'FINISHED'}
+
+# context members set for the duration of the block
+@contextlib.contextmanager
+def temp_override(**members):
+    saved = {name: getattr(bpy.context, name, None) for name in members}
+    for name, value in members.items():
+        setattr(bpy.context, name, value)
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            setattr(bpy.context, name, value)
+
+def create_modules(version):
+    modules = {}
+    def module(name, cls=types.ModuleType):
+        modules[name] = cls(name)
+        return modules[name]
+
+    bpy = module("bpy")
+    bpy.types = module("bpy.types", TypesModule)
+    for name in ('Operator', 'Panel', 'PropertyGroup', 'Object', 'Image', 'Scene', 'SpaceView3D'):
+        setattr(bpy.types, name, type(name, (), {}))
+    bpy.props = module("bpy.props")
+    for kind in PROPERTY_KINDS:
+        setattr(bpy.props, kind, (lambda kind: lambda **options: Property(kind, **options))(kind))
+    bpy.props.__all__ = list(PROPERTY_KINDS)
+
+    bpy.app = module("bpy.app")
+    bpy.app.version = tuple(version)
+    bpy.app.background = True
+    bpy.app.binary_path = ""
+    bpy.app.tempdir = os.path.join(os.path.abspath(os.sep), "tmp")
+    bpy.app.handlers = module("bpy.app.handlers")
+    bpy.app.handlers.persistent = lambda f: f
+    bpy.app.handlers.frame_change_post = []
+    bpy.app.handlers.depsgraph_update_post = []
+    bpy.app.timers = types.SimpleNamespace(register=lambda *a, **k: None, unregister=lambda *a, **k: None, is_registered=lambda f: False)
+
+    bpy.ops = types.SimpleNamespace(
+        object=types.SimpleNamespace(mode_set=mode_set),
+        mesh=types.SimpleNamespace(customdata_custom_splitnormals_clear=customdata_custom_splitnormals_clear),
+        wm=types.SimpleNamespace())
+    bpy.utils = types.SimpleNamespace(register_class=lambda cls: None, unregister_class=lambda cls: None)
+    bpy.path = types.SimpleNamespace(abspath=lambda p: p[2:] if p.startswith("//") else p, clean_name=lambda n: "".join(c if c.isalnum() or c in "-_." else "_" for c in n))
+    bpy.data = types.SimpleNamespace(filepath="", images=types.SimpleNamespace(), objects={}, meshes=Meshes())
+
+    scene = types.SimpleNamespace(dskjal_sn_props=None, frame_start=1, frame_end=250, frame_current=1, objects=[],
+        tool_settings=types.SimpleNamespace(mesh_select_mode=[True, False, False]))
+    view_layer = types.SimpleNamespace(objects=types.SimpleNamespace(active=None))
+    bpy.context = types.SimpleNamespace(scene=scene, view_layer=view_layer, object=None, active_object=None,
+        objects_in_mode=[], evaluated_depsgraph_get=Depsgraph, temp_override=temp_override, window_manager=types.SimpleNamespace(windows=[]), screen=types.SimpleNamespace(areas=[]))
+
+    modules["mathutils"] = types.ModuleType("mathutils")
+    modules["mathutils"].Vector = Vector
+    module("bmesh")
+    module("bpy_extras")
+    io_utils = module("bpy_extras.io_utils")
+    io_utils.ExportHelper = type("ExportHelper", (), {})
+    io_utils.ImportHelper = type("ImportHelper", (), {})
+    modules["bpy_extras"].io_utils = io_utils
+    return modules
+
+bpy = None
+
+# install the stand-in modules once and import the add-on as a module called name
+# several versions of the add-on can be loaded side by side. version sets bpy.app.version
+# the scene properties come from the first add-on loaded
+def load_addon(path=ADDON_PATH, version=(4, 2, 0), name="smooth_normal"):
+    global bpy
+    if bpy is None:
+        modules = create_modules(version)
+        sys.modules.update(modules)
+        bpy = modules["bpy"]
+    bpy.app.version = tuple(version)
+
+    spec = importlib.util.spec_from_file_location(name, path)
+    addon = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(addon)
+    if bpy.context.scene.dskjal_sn_props is None:
+        bpy.context.scene.dskjal_sn_props = create_property_group(addon.DSKJAL_SN_Props)
+    return addon
+
+# make the mesh (or object) the active object in Edit mode. returns the object
+def set_active(data):
+    ob = data if isinstance(data, Object) else Object(data)
+    bpy.context.view_layer.objects.active = ob
+    bpy.context.object = ob
+    bpy.context.active_object = ob
+    bpy.context.scene.objects = [ob]
+    bpy.context.objects_in_mode = [ob]
+    ob.mode = 'EDIT'
+    return ob
+
+#----------------------------------------------------------microbenchmarks-----------------------------------------------------
+# best of repeat in milliseconds. setup runs before each repeat and is not timed
+def time_call(function, setup=None, repeat=5):
+    best = float("inf")
+    for r in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best*1000
+
+def run_microbenchmarks(addon, size, repeat):
+    ob = set_active(grid_mesh(size, size))
+    data = ob.data
+    rng = np.random.default_rng(1)
+    def select_half():
+        data.vertices.arrays["select"][:] = rng.random(len(data.vertices)) < 0.5
+        data.polygons.arrays["select"][:] = rng.random(len(data.polygons)) < 0.5
+        data.custom = None
+        data.update()
+
+    results = {
+        "smooth_selected_normals": time_call(lambda: addon.smooth_selected_normals(data), select_half, repeat),
+        "restore_selected_normals": time_call(lambda: addon.restore_selected_normals(data), select_half, repeat),
+        "set_same_normal": time_call(lambda: addon.set_same_normal(data, (0.0, 0.0, 1.0)), select_half, repeat),
+        "set_face_normal": time_call(lambda: addon.set_face_normal(data), select_half, repeat),
+        "get_loop_normals_array": time_call(lambda: addon.get_loop_normals_array(data), None, repeat),
+        "get_active_normal": time_call(lambda: addon.get_active_normal(bpy.context, ob), select_half, repeat),
+    }
+    print("{} vertices, {} loops".format(len(data.vertices), len(data.loops)))
+    for name, ms in results.items():
+        print("{:28s}{:10.2f} ms".format(name, ms))
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Microbenchmarks of the add-on on the fake bpy")
+    parser.add_argument("--size", type=int, default=300, help="grid of size*size quads")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--version", type=int, nargs=3, default=(4, 2, 0), help="bpy.app.version to emulate")
+    args = parser.parse_args()
+    run_microbenchmarks(load_addon(version=args.version), args.size, args.repeat)
@@ -0,0 +1,187 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# performance regression gate on the fake bpy
+#   1. equivalence: every operation gives the same loop normals as the original per element code
+#      (dev/smooth_normal_reference.py, smooth-normal-420.py of the first commit) within an angle, on a plain grid, a grid with an n-gon
+#      and loose vertices, and a grid with split custom normals
+#   2. timing: every operation on a fixed grid is compared with the baseline stored for this machine
+# exits with 1 if a check fails or this machine has no baseline
+#
+#   python dev/perf_gate.py                    check
+#   python dev/perf_gate.py --update-baseline  store the timings of this machine
+import os
+import sys
+import json
+import math
+import argparse
+import platform
+import subprocess
+import tempfile
+import numpy as np
+
+DEV_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, DEV_DIR)
+import fake_bpy
+
+REPO_DIR = os.path.dirname(DEV_DIR)
+BASELINE_PATH = os.path.join(DEV_DIR, "perf_baselines.json")
+REFERENCE_PATH = os.path.join(DEV_DIR, "smooth_normal_reference.py")
+
+# operations as run by the operators. original and accelerated add-ons share the signatures
+OPERATIONS = {
+    "smooth": lambda addon, ob: addon.smooth_selected_normals(ob.data),
+    "restore": lambda addon, ob: addon.restore_selected_normals(ob.data),
+    "same": lambda addon, ob: addon.set_same_normal(ob.data, (0.0, 0.6, 0.8)),
+    "loop": lambda addon, ob: addon.set_loop_normal(ob.data, (0.6, 0.0, 0.8), list(range(0, len(ob.data.loops), 7))),
+    "face": lambda addon, ob: addon.set_face_normal(ob.data),
+}
+
+# mesh name -> function that builds it in a fixed state. the random selection includes loose vertices and n-gons
+def select_random(data, seed):
+    rng = np.random.default_rng(seed)
+    data.vertices.arrays["select"][:] = rng.random(len(data.vertices)) < 0.5
+    data.vertices.arrays["select"][-1] = True
+    data.polygons.arrays["select"][:] = rng.random(len(data.polygons)) < 0.5
+    data.polygons.arrays["select"][-1] = True
+
+def build_grid(size):
+    data = fake_bpy.grid_mesh(size, size, seed=1)
+    select_random(data, 2)
+    return data
+
+def build_ngon_loose(size):
+    data = fake_bpy.grid_mesh(size, size, seed=3, ngon=True, loose=4)
+    select_random(data, 4)
+    return data
+
+# every other face has flat custom normals, so the corners of most vertices differ
+def build_split(size):
+    data = fake_bpy.grid_mesh(size, size, seed=5, ngon=True)
+    polygon = np.repeat(np.arange(len(data.polygons)), data.polygons.arrays["loop_total"])
+    normals = data.loops.arrays["normal"].copy()
+    flat = polygon % 2 == 0
+    normals[flat] = data.polygons.arrays["normal"][polygon[flat]]
+    data.normals_split_custom_set(normals)
+    select_random(data, 6)
+    return data
+
+MESHES = {"grid": build_grid, "ngon_loose": build_ngon_loose, "split": build_split}
+
+# original add-on kept in dev. a git revision overrides
+def load_original(path, revision):
+    if revision:
+        source = subprocess.check_output(["git", "-C", REPO_DIR, "show", revision + ":smooth-normal-420.py"])
+        handle, path = tempfile.mkstemp(suffix=".py")
+        with os.fdopen(handle, "wb") as f:
+            f.write(source)
+        try:
+            return fake_bpy.load_addon(path, name="smooth_normal_original")
+        finally:
+            os.remove(path)
+    return fake_bpy.load_addon(path or REFERENCE_PATH, name="smooth_normal_original")
+
+# max angle in degrees between the loop normals of two meshes. atan2 stays exact for tiny angles
+def max_angle(a, b):
+    a = a.loops.arrays["normal"].astype(np.float64)
+    b = b.loops.arrays["normal"].astype(np.float64)
+    angles = np.arctan2(np.linalg.norm(np.cross(a, b), axis=1), np.einsum('ij,ij->i', a, b))
+    return math.degrees(float(angles.max())) if len(angles) else 0.0
+
+def check_equivalence(addon, original, size, epsilon):
+    failed = 0
+    for mesh_name, build in MESHES.items():
+        for name, operation in OPERATIONS.items():
+            results = []
+            for module in (original, addon):
+                ob = fake_bpy.set_active(build(size))
+                operation(module, ob)
+                results.append(ob.data)
+            angle = max_angle(results[0], results[1])
+            ok = angle <= epsilon
+            failed += not ok
+            print("{:12s}{:10s}max {:10.6f}°  {}".format(mesh_name, name, angle, "ok" if ok else "DIFFERS"))
+    return failed
+
+def get_machine_key():
+    return "{}-{}-py{}-numpy{}".format(platform.node(), platform.machine(), platform.python_version(), np.__version__)
+
+def time_operations(addon, size, repeat):
+    timings = {}
+    for name, operation in OPERATIONS.items():
+        best = float("inf")
+        for r in range(repeat):
+            ob = fake_bpy.set_active(build_grid(size))
+            best = min(best, fake_bpy.time_call(lambda: operation(addon, ob), repeat=1))
+        timings[name] = best
+    return timings
+
+def check_timings(timings, baseline, tolerance):
+    failed = 0
+    for name, ms in timings.items():
+        if name not in baseline:
+            failed += 1
+            print("{:10s}{:10.2f} ms  NO BASELINE, run with --update-baseline".format(name, ms))
+            continue
+        ratio = ms / baseline[name]
+        ok = ratio <= 1.0 + tolerance
+        failed += not ok
+        print("{:10s}{:10.2f} ms  baseline {:10.2f} ms  x{:.2f}  {}".format(name, ms, baseline[name], ratio, "ok" if ok else "SLOWER"))
+    return failed
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Equivalence and timing gate for the array operations")
+    parser.add_argument("--size", type=int, default=300, help="grid of size*size quads for the timings")
+    parser.add_argument("--equivalence-size", type=int, default=24, help="grid size for the comparison with the original code")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown over the baseline, 0.25 is 25%%")
+    parser.add_argument("--epsilon", type=float, default=0.01, help="allowed angle in degrees against the original code")
+    parser.add_argument("--version", type=int, nargs=3, default=(4, 2, 0), help="bpy.app.version to emulate")
+    parser.add_argument("--original", default="", help="original add-on file. default is dev/smooth_normal_reference.py")
+    parser.add_argument("--revision", default="", help="load smooth-normal-420.py of this git revision as the original add-on instead")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--update-baseline", action="store_true", help="store the timings of this machine")
+    parser.add_argument("--skip-equivalence", action="store_true")
+    args = parser.parse_args(argv)
+
+    addon = fake_bpy.load_addon(version=args.version)
+    failed = 0
+    if not args.skip_equivalence:
+        print("equivalence with the original code (max {}°)".format(args.epsilon))
+        failed += check_equivalence(addon, load_original(args.original, args.revision), args.equivalence_size, args.epsilon)
+
+    timings = time_operations(addon, args.size, args.repeat)
+    baselines = {}
+    if os.path.isfile(args.baseline):
+        with open(args.baseline) as f:
+            baselines = json.load(f)
+    key = "{}-size{}".format(get_machine_key(), args.size)
+    print("timings on {} ({})".format(key, "updating the baseline" if args.update_baseline else "tolerance {:.0%}".format(args.tolerance)))
+    if args.update_baseline:
+        baselines[key] = timings
+        with open(args.baseline, "w") as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+        check_timings(timings, timings, args.tolerance)
+    else:
+        failed += check_timings(timings, baselines.get(key, {}), args.tolerance)
+
+    print("failed" if failed else "passed")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,134 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# operator checks on the fake bpy: Smooth, Restore and Unify run through execute() and the resulting normals are checked
+#
+#   python -m pytest dev/test_operators.py
+#   python dev/test_operators.py
+import os
+import sys
+import numpy as np
+
+DEV_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, DEV_DIR)
+import fake_bpy
+
+addon = fake_bpy.load_addon()
+bpy = fake_bpy.bpy
+
+# run the operator class on the current context. returns (result, reports)
+def run_operator(cls):
+    reports = []
+    op = type(cls.__name__, (cls,), {"report": lambda self, kind, message: reports.append((kind, message))})()
+    return op.execute(bpy.context), reports
+
+def loop_normals(ob):
+    return addon.get_loop_normals_array(ob.data)
+
+def perturb_normals(ob, seed):
+    rng = np.random.default_rng(seed)
+    normals = loop_normals(ob) + rng.normal(0.0, 0.3, (len(ob.data.loops), 3)).astype(np.float32)
+    ob.data.normals_split_custom_set(fake_bpy.normalize(normals))
+
+def reset_scene():
+    scn = bpy.context.scene.dskjal_sn_props
+    scn.ne_smooth_method = 'UNIFORM'
+    scn.ne_unify_objects = False
+    scn.ne_memory_budget = 0
+
+def test_smooth_shares_one_normal_per_vertex():
+    reset_scene()
+    ob = fake_bpy.set_active(fake_bpy.grid_mesh(8, 8, noise=0.5))
+    perturb_normals(ob, 1)
+    result, _ = run_operator(addon.DSKJAL_OT_SmoothButton)
+    assert result == {'FINISHED'}
+
+    normals = loop_normals(ob)
+    loop_vertex = addon.get_loop_vertex_array(ob.data)
+    assert np.allclose(np.linalg.norm(normals, axis=1), 1.0, atol=1e-5)
+    for v in range(len(ob.data.vertices)):
+        assert np.allclose(normals[loop_vertex == v], normals[loop_vertex == v][0], atol=1e-5)
+
+def test_smooth_reduces_neighbour_angles():
+    reset_scene()
+    ob = fake_bpy.set_active(fake_bpy.grid_mesh(8, 8, noise=0.5))
+    edges = addon.get_edge_array(ob.data)
+    def max_edge_angle():
+        vnormals = addon.get_vertex_normals_array(ob.data, loop_normals(ob), addon.get_loop_vertex_array(ob.data))
+        return np.arccos(np.clip(np.einsum('ij,ij->i', vnormals[edges[:, 0]], vnormals[edges[:, 1]]), -1.0, 1.0)).max()
+    before = max_edge_angle()
+    result, _ = run_operator(addon.DSKJAL_OT_SmoothButton)
+    assert result == {'FINISHED'}
+    assert max_edge_angle() < before
+
+def test_restore_returns_default_normals():
+    reset_scene()
+    ob = fake_bpy.set_active(fake_bpy.grid_mesh(6, 6, noise=0.5))
+    default = loop_normals(ob).copy()
+    perturb_normals(ob, 2)
+    assert not np.allclose(loop_normals(ob), default, atol=1e-3)
+
+    result, _ = run_operator(addon.DSKJAL_OT_RevertButton)
+    assert result == {'FINISHED'}
+    assert np.allclose(loop_normals(ob), default, atol=1e-5)
+    assert ob.mode == 'EDIT'
+
+# noise free grids at the same place, so vertex i of every object is coincident
+def coincident_objects(count, offset_last=False):
+    objects = [fake_bpy.Object(fake_bpy.grid_mesh(3, 3, noise=0.0, name="Grid{}".format(i))) for i in range(count)]
+    for i, ob in enumerate(objects):
+        perturb_normals(ob, 10+i)
+    if offset_last:
+        objects[-1].matrix_world = np.eye(4)
+        objects[-1].matrix_world[0, 3] = 100.0
+    fake_bpy.set_active(objects[0])
+    bpy.context.objects_in_mode = objects
+    bpy.context.scene.dskjal_sn_props.ne_unify_objects = True
+    return objects
+
+def vertex_normals(ob):
+    return addon.get_vertex_normals_array(ob.data, loop_normals(ob), addon.get_loop_vertex_array(ob.data))
+
+def test_unify_across_objects():
+    reset_scene()
+    objects = coincident_objects(2)
+    result, _ = run_operator(addon.DSKJAL_OT_UnifyCoincident)
+    assert result == {'FINISHED'}
+    assert np.allclose(vertex_normals(objects[0]), vertex_normals(objects[1]), atol=1e-5)
+
+# the last object has nothing coincident. the operator still finishes because the others were written
+def test_unify_finishes_when_last_object_is_unchanged():
+    reset_scene()
+    objects = coincident_objects(3, offset_last=True)
+    untouched = loop_normals(objects[-1]).copy()
+    result, _ = run_operator(addon.DSKJAL_OT_UnifyCoincident)
+    assert result == {'FINISHED'}
+    assert not addon.stats["skipped"]
+    assert np.allclose(vertex_normals(objects[0]), vertex_normals(objects[1]), atol=1e-5)
+    assert np.array_equal(loop_normals(objects[-1]), untouched)
+
+if __name__ == "__main__":
+    failed = 0
+    for name, test in sorted((k, v) for k, v in globals().items() if k.startswith("test_")):
+        try:
+            test()
+            print("passed", name)
+        except AssertionError:
+            failed += 1
+            print("FAILED", name)
+    sys.exit(1 if failed else 0)
@@ -21,7 +21,25 @@ import math
 import mathutils
 import copy
 import bmesh
+import numpy as np
+import sys
+import tracemalloc
+import os
+import glob
+import json
+import time
+import fnmatch
+import hashlib
+import struct
+import shutil
+import argparse
+import tempfile
+import subprocess
+import traceback
+import zipfile
+import concurrent.futures
 from bpy.props import *
+from bpy_extras.io_utils import ExportHelper, ImportHelper
 
 # bl_info = {
 #     "name" : "Normal Smooth Tool",             
@@ -43,46 +61,46 @@ def update_scene():
 def get_vertex_normal(data, index):
     normal = data.vertices[index].normal
     if data.has_custom_normals:
-        for l in data.loops:
-            if index == l.vertex_index:
-                return l.normal
+        loops = get_vertex_loops(data, index)
+        if loops:
+            calc_normals_split(data)
+            return get_loop_normal(data, loops[0])
     
     return normal
 
+# loop normals are read from data.corner_normals since 4.1. before that calc_normals_split fills loop.normal
+CORNER_NORMALS_VERSION = (4, 1, 0)
+
+def has_corner_normals():
+    return bpy.app.version >= CORNER_NORMALS_VERSION
+
+# meshes whose split normals were calculated in the running operator. normals change only when written
+split_normals = {"operator": False, "ready": set()}
+
 # require Object mode
 def calc_normals_split(data):
-    data.corner_normals
+    if has_corner_normals():
+        return
+    if split_normals["operator"] and data.as_pointer() in split_normals["ready"]:
+        return
+    data.calc_normals_split()
+    if split_normals["operator"]:
+        split_normals["ready"].add(data.as_pointer())
 
-# require Object mode
-def get_vertex_normals(data):
-    normals = [(0.0,0.0,0.0)]*len(data.vertices)
-    if data.has_custom_normals:
-        calc_normals_split(data)
-        for poly in data.polygons:
-            for i in range( poly.loop_start, poly.loop_start + poly.loop_total ):
-                l = data.loops[i]
-                normals[l.vertex_index] = l.normal         
-    else:
-        for i in data.vertices:
-            normals[i.index] = i.normal
-            
-    return normals
+def reset_normals_split(operator):
+    split_normals["operator"] = operator
+    split_normals["ready"].clear()
 
+# require Object mode. calc_normals_split first
+def get_loop_normal(data, loop_index):
+    if has_corner_normals():
+        return data.corner_normals[loop_index].vector
+    return data.loops[loop_index].normal
+
+# loops of a vertex in polygon order
 # require Object mode
-def get_loop_normals(data):
-    calc_normals_split(data)
-    return [l.normal for l in data.loops]
-    
-# require Object mode
-def create_loop_table(data):
-    to_loops = [[] for row in range(len(data.vertices))]
-        
-    for p in data.polygons:
-        for i in range( p.loop_start, p.loop_start + p.loop_total ):
-            index = data.loops[i].vertex_index
-            to_loops[index].append(i)
-            
-    return to_loops
+def get_vertex_loops(data, index):
+    return np.flatnonzero(get_loop_vertex_array(data) == index).tolist()
 
 # return None if can not get
 # else return (index, normal)
@@ -120,85 +138,1118 @@ def is_split_mode():
 def get_loop_index():
     return bpy.context.scene.dskjal_sn_props.ne_view_normal_index
 
+def get_smooth_workers():
+    return bpy.context.scene.dskjal_sn_props.ne_smooth_workers
+
+# (axis, distance) of the mirror option or None
+def get_mirror():
+    scn = bpy.context.scene.dskjal_sn_props
+    return None if scn.ne_mirror_axis == 'NONE' else (scn.ne_mirror_axis, scn.ne_mirror_distance)
+
+# blend relative paths go to the temp folder while the file is not saved
+def resolve_blend_path(path):
+    if path.startswith("//") and not bpy.data.filepath:
+        path = os.path.join(bpy.app.tempdir, path[2:])
+    return bpy.path.abspath(path)
+
+#----------------------------------------------------------instrumentation-----------------------------------------------------
+# stats of the last operator. shown in the panel
+# with memory tracking on, the peak Python allocation (tracemalloc) is recorded for the operator and its stages
+stats = {"operation": "", "seconds": 0.0, "loops": 0, "changed_loops": 0, "skipped": False, "per_vertex": False, "peak_bytes": 0, "buffer_bytes": 0,
+    "tracking": False, "stages": {}}
+
+# the batch worker runs without the scene properties
+def is_memory_tracking():
+    props = getattr(bpy.context.scene, "dskjal_sn_props", None)
+    return props != None and props.ne_memory_tracking
+
+def begin_stats(operation):
+    stats.update(operation=operation, seconds=0.0, loops=0, changed_loops=0, skipped=False, per_vertex=False, peak_bytes=0, buffer_bytes=0,
+        tracking=is_memory_tracking(), stages={})
+    if stats["tracking"]:
+        stats["own_tracing"] = not tracemalloc.is_tracing()
+        if stats["own_tracing"]:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        stats["base_bytes"] = tracemalloc.get_traced_memory()[0]
+    reset_normals_split(True)
+    stats["start"] = time.perf_counter()
+
+def end_stats():
+    stats["seconds"] = time.perf_counter() - stats["start"]
+    reset_normals_split(False)
+    if stats["tracking"]:
+        stats["peak_bytes"] = max(stats["peak_bytes"], tracemalloc.get_traced_memory()[1] - stats["base_bytes"])
+        stats["tracking"] = False
+        if stats["own_tracing"]:
+            tracemalloc.stop()
+
+# decorator for the stages of an operator: calls, time, peak allocation and bytes of the returned arrays
+# stages do not nest. the peak is reset at each stage, so the peak of the operator is carried in stats
+def memory_stage(name):
+    def decorate(function):
+        def run(*args, **kwargs):
+            if not stats["tracking"]:
+                return function(*args, **kwargs)
+            before, peak = tracemalloc.get_traced_memory()
+            stats["peak_bytes"] = max(stats["peak_bytes"], peak - stats["base_bytes"])
+            tracemalloc.reset_peak()
+            start = time.perf_counter()
+            result = function(*args, **kwargs)
+            seconds = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1]
+            stats["peak_bytes"] = max(stats["peak_bytes"], peak - stats["base_bytes"])
+
+            stage = stats["stages"].setdefault(name, {"calls": 0, "seconds": 0.0, "peak_bytes": 0, "array_bytes": 0})
+            stage["calls"] += 1
+            stage["seconds"] += seconds
+            stage["peak_bytes"] = max(stage["peak_bytes"], peak - before)
+            stage["array_bytes"] += sum(a.nbytes for a in (result if isinstance(result, tuple) else (result,)) if isinstance(a, np.ndarray))
+            return result
+        return run
+    return decorate
+
+# rough upper bound of the memory of an edit, from the peaks of the array operations
+# per loop: normals, candidates and indices. per edge: the sorted adjacency. per vertex: vertex normals and results
+BUDGET_LOOP_BYTES = 48
+BUDGET_EDGE_BYTES = 32
+BUDGET_VERTEX_BYTES = 40
+
+def estimate_memory_bytes(data):
+    return len(data.loops)*BUDGET_LOOP_BYTES + len(data.edges)*BUDGET_EDGE_BYTES + len(data.vertices)*BUDGET_VERTEX_BYTES
+
+# images: rgba float32 buffer, the copy for foreach_set, the dilation gathers and masks
+BUDGET_PIXEL_BYTES = 52
+# normal cache: one float32 normal per loop and frame, plus the evaluated mesh of the frame
+BUDGET_FRAME_LOOP_BYTES = 12
+
+# False (and an error report) if the estimate for the meshes plus extra bytes is over the memory budget of the scene
+def check_memory_budget(operator, objects=None, extra=0):
+    budget = bpy.context.scene.dskjal_sn_props.ne_memory_budget
+    if budget <= 0:
+        return True
+    if objects == None:
+        objects = [bpy.context.view_layer.objects.active]
+    need = sum(estimate_memory_bytes(ob.data) for ob in objects if ob != None and ob.type == 'MESH') + extra
+    if need <= budget*2**20:
+        return True
+    operator.report({'ERROR'}, "Needs about {:.0f} MB, over the memory budget of {} MB".format(need/2**20, budget))
+    return False
+
+def format_stats():
+    if stats["skipped"]:
+        text = "{}: no change, skipped ({:.1f} ms)".format(stats["operation"], stats["seconds"]*1000)
+    else:
+        text = "{}: {}/{} loops{} ({:.1f} ms)".format(stats["operation"], stats["changed_loops"], stats["loops"], " per vertex" if stats["per_vertex"] else "", stats["seconds"]*1000)
+    if stats["peak_bytes"] > 0:
+        text += " peak {:.1f} MB".format(stats["peak_bytes"]/2**20)
+        if stats["buffer_bytes"] > 0:
+            text += " ({:.1f}x)".format(stats["peak_bytes"]/stats["buffer_bytes"])
+    return text
+
+def format_stage_stats():
+    return ["  {}: {:.1f} ms, peak {:.1f} MB, arrays {:.1f} MB{}".format(name, stage["seconds"]*1000, stage["peak_bytes"]/2**20, stage["array_bytes"]/2**20,
+        " ({} calls)".format(stage["calls"]) if stage["calls"] > 1 else "") for name, stage in stats["stages"].items()]
+
+#----------------------------------------------------------array tools-----------------------------------------------------
+# selections are processed in chunks of this many elements so temporaries stay small
+CHUNK_SIZE = 1 << 16
+
+def iter_chunks(count, size=CHUNK_SIZE):
+    for start in range(0, count, size):
+        yield start, min(start+size, count)
+
+# float32 buffer of all loop normals
+# require Object mode
+@memory_stage("loop normals")
+def get_loop_normals_array(data):
+    normals = np.empty(len(data.loops)*3, dtype=np.float32)
+    if has_corner_normals():
+        data.corner_normals.foreach_get("vector", normals)
+    else:
+        calc_normals_split(data)
+        data.loops.foreach_get("normal", normals)
+    return normals.reshape(-1, 3)
+
+@memory_stage("loop table")
+def get_loop_vertex_array(data):
+    indices = np.empty(len(data.loops), dtype=np.int32)
+    data.loops.foreach_get("vertex_index", indices)
+    return indices
+
+def get_edge_array(data):
+    edges = np.empty(len(data.edges)*2, dtype=np.int32)
+    data.edges.foreach_get("vertices", edges)
+    return edges.reshape(-1, 2)
+
+def get_vertex_selection_array(data):
+    selected = np.empty(len(data.vertices), dtype=bool)
+    data.vertices.foreach_get("select", selected)
+    return selected
+
+def get_vertex_co_array(data):
+    co = np.empty(len(data.vertices)*3, dtype=np.float32)
+    data.vertices.foreach_get("co", co)
+    return co.reshape(-1, 3)
+
+# weights of a float point attribute (bulk read) or a vertex group (read per vertex). None if not found
+def get_vertex_weight_array(ob, name):
+    data = ob.data
+    attribute = data.attributes.get(name) if name else None
+    if attribute != None and attribute.domain == 'POINT' and attribute.data_type == 'FLOAT':
+        weights = np.empty(len(data.vertices), dtype=np.float32)
+        attribute.data.foreach_get("value", weights)
+        return weights
+
+    vg = ob.vertex_groups.get(name) if name else None
+    if vg == None:
+        return None
+    weights = np.zeros(len(data.vertices), dtype=np.float32)
+    for v in data.vertices:
+        for g in v.groups:
+            if g.group == vg.index:
+                weights[v.index] = g.weight
+    return weights
+
+def get_vertex_normal_array(data):
+    normals = np.empty(len(data.vertices)*3, dtype=np.float32)
+    data.vertices.foreach_get("normal", normals)
+    return normals.reshape(-1, 3)
+
+# write the selection flags. edges follow the vertices, polygons too unless given
+# require Object mode
+def set_selection_arrays(data, vertex_selected, polygon_selected=None):
+    data.vertices.foreach_set("select", vertex_selected)
+    data.edges.foreach_set("select", vertex_selected[get_edge_array(data)].all(axis=1))
+    if polygon_selected is None:
+        starts, totals, _ = get_polygon_arrays(data)
+        if len(starts) == 0:
+            return
+        polygon_selected = np.logical_and.reduceat(vertex_selected[get_loop_vertex_array(data)], starts)
+    data.polygons.foreach_set("select", polygon_selected)
+
+# default shading normal of each loop as Blender computes it without custom normals: split at sharp edges,
+# flat faces and (before 4.1) the auto smooth angle. zero custom normals keep the defaults, so a temporary copy
+# with zero custom normals is read when the mesh has custom normals
+# require Object mode
+def get_default_loop_normals_array(data):
+    if not data.has_custom_normals:
+        return get_loop_normals_array(data)
+    temp = data.copy()
+    try:
+        temp.normals_split_custom_set(np.zeros((len(temp.loops), 3), dtype=np.float32))
+        return get_loop_normals_array(temp)
+    finally:
+        split_normals["ready"].discard(temp.as_pointer())
+        bpy.data.meshes.remove(temp)
+
+# return (loop_start, loop_total, select)
+def get_polygon_arrays(data):
+    starts = np.empty(len(data.polygons), dtype=np.int32)
+    totals = np.empty(len(data.polygons), dtype=np.int32)
+    selected = np.empty(len(data.polygons), dtype=bool)
+    data.polygons.foreach_get("loop_start", starts)
+    data.polygons.foreach_get("loop_total", totals)
+    data.polygons.foreach_get("select", selected)
+    return starts, totals, selected
+
+def get_polygon_normal_array(data):
+    normals = np.empty(len(data.polygons)*3, dtype=np.float32)
+    data.polygons.foreach_get("normal", normals)
+    return normals.reshape(-1, 3)
+
+# polygon index of each loop in chunk. loop_start is sorted
+def get_loop_polygons(starts, chunk):
+    return np.searchsorted(starts, chunk, side='right') - 1
+
+# loop mask of the selected polygons
+def get_polygon_loop_mask(starts, totals, selected, loop_count):
+    delta = np.zeros(loop_count+1, dtype=np.int8)
+    delta[starts[selected]] = 1
+    delta[(starts+totals)[selected]] -= 1
+    return np.cumsum(delta[:-1], dtype=np.int8) > 0
+
+# same rule as get_vertex_normals. the last corner of a vertex wins, loose vertices are zero
+def get_vertex_normals_array(data, loop_normals, loop_vertex):
+    if not data.has_custom_normals:
+        return get_vertex_normal_array(data)
+
+    normals = np.zeros((len(data.vertices), 3), dtype=np.float32)
+    last = np.full(len(data.vertices), -1, dtype=np.int32)
+    for start, end in iter_chunks(len(loop_vertex)):
+        np.maximum.at(last, loop_vertex[start:end], np.arange(start, end, dtype=np.int32))
+    has_loop = last >= 0
+    normals[has_loop] = loop_normals[last[has_loop]]
+    return normals
+
+# vertex -> neighbours in edge order. same order as the edge table of the original per vertex smoothing
+@memory_stage("edge table")
+def create_adjacency_array(edges, vertex_count):
+    src = edges.ravel()
+    order = np.argsort(src, kind='stable')
+    # the other end of edge k is at 2k+1 for 2k and 2k for 2k+1
+    neighbours = src[order ^ 1]
+    del order
+    offsets = np.zeros(vertex_count+1, dtype=np.int64)
+    np.cumsum(np.bincount(src, minlength=vertex_count), out=offsets[1:])
+    return offsets, neighbours
+
+# adjacency of the last mesh. the key hashes the edge table, so edits that keep the counts rebuild it
+topology_cache = {"key": None}
+
+# require Object mode
+def get_cached_adjacency(data):
+    edges = get_edge_array(data)
+    key = (data.as_pointer(), len(data.vertices), hashlib.blake2b(edges.tobytes(), digest_size=16).digest())
+    if topology_cache["key"] != key:
+        topology_cache.clear()
+        topology_cache["key"] = key
+        topology_cache["adjacency"] = create_adjacency_array(edges, len(data.vertices))
+    return topology_cache["adjacency"]
+
+# polygon index of every loop. polygons are contiguous in loop order
+def get_loop_polygon_array(starts, totals):
+    return np.repeat(np.arange(len(starts), dtype=np.int32), totals)
+
+# twice the area times the normal of each polygon (Newell's method, works for n-gons)
+def get_polygon_area_vectors_array(co, loop_vertex, starts, totals):
+    if len(starts) == 0:
+        return np.empty((0, 3), dtype=co.dtype)
+    next_loop = np.arange(1, len(loop_vertex)+1)
+    next_loop[starts + totals - 1] = starts
+    return np.add.reduceat(np.cross(co[loop_vertex], co[loop_vertex[next_loop]]), starts, axis=0)
+
+# area weighted vertex normals from positions
+# without normalize the length is twice the summed area
+def get_area_weighted_normals_array(co, loop_vertex, starts, totals, normalize=True):
+    pvectors = get_polygon_area_vectors_array(co, loop_vertex, starts, totals)
+    vnormals = np.zeros((len(co), 3), dtype=np.float32)
+    np.add.at(vnormals, loop_vertex, pvectors[get_loop_polygon_array(starts, totals)])
+    return normalize_array(vnormals) if normalize else vnormals
+
+# mean of the loop normals of each vertex
+def get_average_vertex_normals_array(loop_normals, loop_vertex, vertex_count):
+    vnormals = np.zeros((vertex_count, 3), dtype=np.float32)
+    for start, end in iter_chunks(len(loop_vertex)):
+        np.add.at(vnormals, loop_vertex[start:end], loop_normals[start:end])
+    return normalize_array(vnormals)
+
+# connected component label (smallest member index) of count elements joined by pairs
+# vectorized union-find: hook the larger root onto the smaller, then compress by pointer jumping
+def label_components(count, pairs):
+    parent = np.arange(count, dtype=np.int64)
+    a = pairs[:, 0]
+    b = pairs[:, 1]
+    while True:
+        pa = parent[a]
+        pb = parent[b]
+        differ = pa != pb
+        if not differ.any():
+            return parent
+        a = a[differ]
+        b = b[differ]
+        np.minimum.at(parent, np.maximum(pa[differ], pb[differ]), np.minimum(pa[differ], pb[differ]))
+        while True:
+            jumped = parent[parent]
+            if np.array_equal(jumped, parent):
+                break
+            parent = jumped
+
+# pairs of points closer than distance. uniform grid with cell size distance, each pair reported once
+def find_close_pairs(points, distance):
+    if not distance > 0:
+        raise ValueError("Distance must be greater than zero")
+    if len(points) < 2:
+        return np.empty((0, 2), dtype=np.int64)
+
+    # one cell of padding on each side so neighbour cells never wrap
+    cells = np.floor((points - points.min(axis=0)) / distance).astype(np.int64) + 1
+    dims = cells.max(axis=0) + 2
+    if float(dims[0]) * float(dims[1]) * float(dims[2]) >= 2.0**62:
+        raise ValueError("Distance is too small for the size of the meshes")
+    keys = (cells[:, 0]*dims[1] + cells[:, 1])*dims[2] + cells[:, 2]
+    order = np.argsort(keys, kind='stable')
+    keys = keys[order]
+    points = points[order]
+
+    # half of the 3x3x3 neighbourhood
+    offsets = [(dx, dy, dz) for dx in (-1, 0, 1) for dy in (-1, 0, 1) for dz in (-1, 0, 1) if (dx, dy, dz) > (0, 0, 0)]
+    pairs = []
+    for start, end in iter_chunks(len(keys)):
+        chunk = np.arange(start, end)
+        for d in [(0, 0, 0)] + offsets:
+            neighbour = keys[start:end] + (d[0]*dims[1] + d[1])*dims[2] + d[2]
+            lo = chunk + 1 if d == (0, 0, 0) else np.searchsorted(keys, neighbour, side='left')
+            hi = np.searchsorted(keys, neighbour, side='right')
+            counts = np.maximum(hi - lo, 0)
+            total = counts.sum()
+            if total == 0:
+                continue
+            i = np.repeat(chunk, counts)
+            j = np.arange(total) + np.repeat(lo - np.concatenate(([0], np.cumsum(counts)[:-1])), counts)
+            diff = points[i] - points[j]
+            close = np.einsum('ij,ij->i', diff, diff) <= distance*distance
+            pairs.append(np.stack((order[i[close]], order[j[close]]), axis=1))
+
+    return np.concatenate(pairs) if pairs else np.empty((0, 2), dtype=np.int64)
+
+# adjacency as in create_adjacency_array plus the length of the edge behind each neighbour
+def create_weighted_adjacency_array(edges, lengths, vertex_count):
+    offsets, neighbours = create_adjacency_array(edges, vertex_count)
+    weights = lengths[np.argsort(edges.ravel(), kind='stable') >> 1]
+    return offsets, neighbours, weights
+
+# shortest path length from sources over the weighted adjacency. inf if not reachable
+# vectorized Bellman-Ford: each round relaxes only the neighbour rows of vertices that improved
+def get_edge_distance_array(offsets, neighbours, weights, sources):
+    distance = np.full(len(offsets)-1, np.inf)
+    frontier = np.unique(np.asarray(sources, dtype=np.int64))
+    distance[frontier] = 0.0
+    while len(frontier):
+        counts = offsets[frontier+1] - offsets[frontier]
+        targets = gather_csr(offsets, neighbours, frontier)
+        candidate = np.repeat(distance[frontier], counts) + gather_csr(offsets, weights, frontier)
+        better = candidate < distance[targets]
+        targets = targets[better]
+        np.minimum.at(distance, targets, candidate[better])
+        frontier = np.unique(targets)
+    return distance
+
+# spherical interpolation from unit vector a to unit vector b at each t
+def slerp_array(a, b, t):
+    a = np.asarray(a, dtype=np.float64)
+    b = np.asarray(b, dtype=np.float64)
+    t = np.asarray(t, dtype=np.float64)[:, None]
+    omega = math.acos(min(max(float(np.dot(a, b)), -1.0), 1.0))
+    if math.sin(omega) < 1e-6 and omega > 1.0:
+        # opposite directions have no unique arc. turn about an axis perpendicular to a
+        p = np.cross(a, np.eye(3)[np.argmin(np.abs(a))])
+        p /= np.linalg.norm(p)
+        return np.cos(t*omega)*a + np.sin(t*omega)*p
+    if math.sin(omega) < 1e-6:
+        return normalize_array(a*(1.0 - t) + b*t)
+    return (np.sin((1.0 - t)*omega)*a + np.sin(t*omega)*b) / math.sin(omega)
+
+# rotate each vector by the shortest arc from from_dirs to to_dirs (all unit length)
+def rotate_vectors_array(vectors, from_dirs, to_dirs):
+    k = np.cross(from_dirs, to_dirs)
+    c = np.einsum('ij,ij->i', from_dirs, to_dirs)[:, None]
+    scale = np.divide(np.einsum('ij,ij->i', k, vectors)[:, None], 1.0 + c, out=np.zeros_like(c), where=(1.0 + c) > 1e-6)
+    return vectors*c + np.cross(k, vectors) + k*scale
+
+def normalize_array(vectors):
+    lengths = np.sqrt(np.einsum('ij,ij->i', vectors, vectors))[:, None]
+    np.divide(vectors, lengths, out=vectors, where=lengths > 0)
+    return vectors
+
+# smoothed normal of each vertex in indices
+# reads only vnormals, so the result of a vertex does not depend on how indices is split
+def smooth_vertex_normals_array(vnormals, offsets, neighbours, indices):
+    if len(indices) == 0:
+        return np.empty((0, 3), dtype=vnormals.dtype)
+
+    # one segment per vertex: the vertex itself followed by its neighbours
+    counts = offsets[indices+1] - offsets[indices]
+    seg_start = np.zeros(len(indices), dtype=np.int64)
+    np.cumsum(counts[:-1]+1, out=seg_start[1:])
+    gather = np.empty(seg_start[-1] + counts[-1] + 1, dtype=np.int64)
+    gather[seg_start] = indices
+
+    is_neighbour = np.ones(len(gather), dtype=bool)
+    is_neighbour[seg_start] = False
+    nb_start = seg_start - np.arange(len(indices))
+    gather[is_neighbour] = neighbours[np.arange(counts.sum()) + np.repeat(offsets[indices] - nb_start, counts)]
+
+    return normalize_array(np.add.reduceat(vnormals[gather], seg_start, axis=0))
+
+# split the selection into contiguous shards. the 1-ring halo of each shard is read from the shared vnormals
+# numpy releases the GIL in the gather and the reduction, so the shards run in parallel on threads
+# each shard is processed in chunks to bound the temporaries
+def smooth_vertex_normals_sharded(vnormals, offsets, neighbours, indices, workers):
+    out = np.empty((len(indices), 3), dtype=vnormals.dtype)
+    workers = max(1, min(workers, len(indices)))
+    bounds = np.linspace(0, len(indices), workers+1).astype(np.int64)
+
+    def run(shard):
+        for start, end in iter_chunks(bounds[shard+1] - bounds[shard]):
+            start, end = start + bounds[shard], end + bounds[shard]
+            out[start:end] = smooth_vertex_normals_array(vnormals, offsets, neighbours, indices[start:end])
+
+    if workers == 1:
+        run(0)
+    else:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(run, range(workers)))
+
+    return out
+
+# bilateral filter of the vertex normals of indices: the vertex itself has weight 1 and each neighbour
+# exp(-d^2/2sd^2) * exp(-a^2/2sa^2) for distance d and angle a between the normals, so creases are kept
+# sigma_distance is relative to the mean edge length of the selection. sigma_angle is in radians
+# every iteration reads the result of the previous one, so the result does not depend on the chunks
+def bilateral_vertex_normals_array(vnormals, co, offsets, neighbours, indices, iterations=1, sigma_distance=1.0, sigma_angle=math.radians(30)):
+    vnormals = vnormals.copy()
+    if len(indices) == 0:
+        return vnormals[indices]
+
+    # per edge arrays of the selection, built once. rows are in index order
+    counts = offsets[indices+1] - offsets[indices]
+    edge_offsets = np.zeros(len(indices)+1, dtype=np.int64)
+    np.cumsum(counts, out=edge_offsets[1:])
+    rows = np.repeat(np.arange(len(indices), dtype=np.int32), counts)
+    others = gather_csr(offsets, neighbours, indices)
+    distance = np.empty(len(others), dtype=np.float32)
+    for start, end in iter_chunks(len(others)):
+        d = co[others[start:end]] - co[indices[rows[start:end]]]
+        distance[start:end] = np.einsum('ij,ij->i', d, d)
+    sigma = sigma_distance * (np.sqrt(distance).mean() if len(distance) else 0.0)
+    spatial = np.exp(distance / (-2.0*sigma*sigma)).astype(np.float32) if sigma > 0 else np.ones(len(others), dtype=np.float32)
+    del distance
+
+    out = np.empty((len(indices), 3), dtype=vnormals.dtype)
+    for i in range(iterations):
+        for start, end in iter_chunks(len(indices)):
+            lo, hi = edge_offsets[start], edge_offsets[end]
+            local = rows[lo:hi] - start
+            nb = vnormals[others[lo:hi]]
+            angle = np.arccos(np.clip(np.einsum('ij,ij->i', nb, vnormals[indices[start:end]][local]), -1.0, 1.0))
+            weights = spatial[lo:hi] * np.exp(np.square(angle / sigma_angle) * -0.5) if sigma_angle > 0 else spatial[lo:hi]
+            summed = vnormals[indices[start:end]].astype(np.float64)
+            for c in range(3):
+                summed[:, c] += np.bincount(local, weights=weights*nb[:, c], minlength=end-start)
+            out[start:end] = summed
+        vnormals[indices] = normalize_array(out)
+
+    return vnormals[indices]
+
+# loops whose normal turns less than this are treated as unchanged
+CHANGE_EPSILON = math.radians(0.05)
+
+# number of loops that differ by more than epsilon. zero length candidates always count as changed
+def count_changed_normals(current, candidate, epsilon=CHANGE_EPSILON):
+    if len(candidate) == 0:
+        return 0
+    cos = np.einsum('ij,ij->i', candidate, current)
+    return int(np.count_nonzero(~(cos >= math.cos(epsilon))))
+
+# normals[mask] = values, chunk by chunk
+# values is one vector or a function that returns the new normals of the loop indices passed to it
+# returns (affected loops, changed loops)
+def assign_loop_normals(normals, mask, values):
+    if not callable(values):
+        vector = normalize_array(np.array([values], dtype=np.float32))
+        values = lambda loops: vector
+
+    affected = 0
+    changed = 0
+    for start, end in iter_chunks(len(mask)):
+        loops = start + np.flatnonzero(mask[start:end])
+        if len(loops) == 0:
+            continue
+        new = normalize_array(np.array(np.broadcast_to(values(loops), (len(loops), 3)), dtype=np.float32))
+        changed += count_changed_normals(normals[loops], new)
+        normals[loops] = new
+        affected += len(loops)
+
+    return affected, changed
+
+# one normal per vertex if every corner is within epsilon of the first corner of its vertex, else None
+# stops at the first chunk with a split vertex. loose vertices are zero (default normal)
+def get_uniform_vertex_normals(normals, loop_vertex, vertex_count, epsilon=CHANGE_EPSILON):
+    first = np.full(vertex_count, -1, dtype=np.int32)
+    first[loop_vertex[::-1]] = np.arange(len(loop_vertex)-1, -1, -1, dtype=np.int32)
+    cos = math.cos(epsilon)
+    for start, end in iter_chunks(len(loop_vertex)):
+        if not (np.einsum('ij,ij->i', normals[start:end], normals[first[loop_vertex[start:end]]]) >= cos).all():
+            return None
+
+    vnormals = np.zeros((vertex_count, 3), dtype=np.float32)
+    has_loop = first >= 0
+    vnormals[has_loop] = normals[first[has_loop]]
+    return vnormals
+
+@memory_stage("write")
+def write_custom_normals(data, normals, loop_vertex):
+    vnormals = get_uniform_vertex_normals(normals, loop_vertex, len(data.vertices))
+    if vnormals is None:
+        stats["per_vertex"] = False
+        data.normals_split_custom_set(normals)
+    else:
+        stats["per_vertex"] = True
+        data.normals_split_custom_set_from_vertices(vnormals)
+
+# write normals only if assign_loop_normals changed a loop. returns True if written
+# when the corners of every vertex agree the normals are written per vertex, a buffer smaller by the loop/vertex ratio
+# require Object mode
+def commit_loop_normals(data, normals, affected, changed):
+    stats["loops"] += affected
+    stats["changed_loops"] += changed
+    stats["buffer_bytes"] = max(stats["buffer_bytes"], normals.nbytes)
+    if changed == 0:
+        stats["skipped"] = True
+        return False
+
+    stats["skipped"] = False
+    write_custom_normals(data, normals, get_loop_vertex_array(data))
+    split_normals["ready"].discard(data.as_pointer())
+    return True
+
+# require Object mode
+def read_smooth_arrays(data):
+    # adjacency first. its sort temporaries are freed before the loop buffers are read
+    offsets, neighbours = get_cached_adjacency(data)
+    loop_normals = get_loop_normals_array(data)
+    loop_vertex = get_loop_vertex_array(data)
+    vnormals = get_vertex_normals_array(data, loop_normals, loop_vertex)
+    return loop_normals, loop_vertex, vnormals, offsets, neighbours
+
+# require Object mode
+def benchmark_sharded_smooth(data, worker_counts=(1, 2, 4, 8), repeat=3):
+    loop_normals, loop_vertex, vnormals, offsets, neighbours = read_smooth_arrays(data)
+    indices = np.flatnonzero(get_vertex_selection_array(data))
+
+    results = []
+    reference = None
+    for workers in worker_counts:
+        best = float("inf")
+        for r in range(repeat):
+            start = time.perf_counter()
+            out = smooth_vertex_normals_sharded(vnormals, offsets, neighbours, indices, workers)
+            best = min(best, time.perf_counter() - start)
+        if reference is None:
+            reference = out
+        results.append({
+            "workers": workers,
+            "seconds": best,
+            "speedup": results[0]["seconds"] / best if results else 1.0,
+            "identical": out.tobytes() == reference.tobytes()
+        })
+
+    return results
+
+# bulk read of the loop normals against the per loop read of the original code
+# require Object mode
+def benchmark_normal_reads(data, repeat=3):
+    timings = {}
+    for name in ("bulk", "per_loop"):
+        best = float("inf")
+        for r in range(repeat):
+            reset_normals_split(True)
+            start = time.perf_counter()
+            if name == "bulk":
+                bulk = get_loop_normals_array(data)
+            else:
+                calc_normals_split(data)
+                per_loop = np.array([tuple(get_loop_normal(data, i)) for i in range(len(data.loops))], dtype=np.float32).reshape(-1, 3)
+            best = min(best, time.perf_counter() - start)
+        timings[name] = best
+    reset_normals_split(False)
+
+    return {
+        "version": ".".join(str(v) for v in bpy.app.version),
+        "path": "corner_normals" if has_corner_normals() else "calc_normals_split",
+        "bulk_seconds": timings["bulk"],
+        "per_loop_seconds": timings["per_loop"],
+        "speedup": timings["per_loop"] / max(timings["bulk"], 1e-9),
+        "identical": bulk.tobytes() == per_loop.tobytes()
+    }
+
+#----------------------------------------------------------mirror-----------------------------------------------------
+# the mirror plane goes through the object origin, as the mesh symmetry of Blender
+MIRROR_AXES = {'X': 0, 'Y': 1, 'Z': 2}
+
+# loop -> mirror loop of the last mesh, loops with a mirror other than themselves
+# and whether the loop wins when both sides are edited
+mirror_cache = {"key": None, "loops": None, "paired": None, "master": None}
+
+# vertex -> vertex at the reflected position within distance, -1 if none. the closest one wins
+def find_mirror_vertices(co, axis, distance):
+    reflected = co.copy()
+    reflected[:, axis] *= -1.0
+    count = len(co)
+    pairs = find_close_pairs(np.concatenate((co, reflected)), distance)
+    pairs = pairs[(pairs[:, 0] < count) != (pairs[:, 1] < count)]
+    pairs.sort(axis=1)
+    pairs[:, 1] -= count
+
+    # co[i] is close to the reflection of j, so i is the mirror of j
+    diff = co[pairs[:, 0]] - reflected[pairs[:, 1]]
+    order = np.lexsort((np.einsum('ij,ij->i', diff, diff), pairs[:, 1]))
+    pairs = pairs[order]
+    first = np.unique(pairs[:, 1], return_index=True)[1]
+    mirror = np.full(count, -1, dtype=np.int64)
+    mirror[pairs[first, 1]] = pairs[first, 0]
+    return mirror
+
+# loop -> mirror loop, -1 if none. the winding flips in the mirror, so the loop of v followed by w
+# maps to the loop of mirror(v) preceded by mirror(w). loops are found by their (vertex, previous vertex) key
+def find_mirror_loops(mirror_vertex, loop_vertex, starts, totals):
+    count = len(mirror_vertex)
+    next_loop = np.arange(1, len(loop_vertex)+1)
+    next_loop[starts + totals - 1] = starts
+    prev_vertex = np.empty_like(loop_vertex)
+    prev_vertex[next_loop] = loop_vertex
+    keys = loop_vertex.astype(np.int64)*count + prev_vertex
+    order = np.argsort(keys, kind='stable')
+    keys = keys[order]
+    del prev_vertex
+
+    loops = np.full(len(loop_vertex), -1, dtype=np.int64)
+    for start, end in iter_chunks(len(loop_vertex)):
+        v = mirror_vertex[loop_vertex[start:end]]
+        w = mirror_vertex[loop_vertex[next_loop[start:end]]]
+        query = v*count + w
+        found = np.minimum(np.searchsorted(keys, query), max(len(keys)-1, 0))
+        valid = (v >= 0) & (w >= 0) & (keys[found] == query)
+        loops[start:end][valid] = order[found[valid]]
+    return loops
+
+# cached per mesh, axis, distance, positions and topology. build in Object mode
+def get_mirror_loop_array(data, axis, distance):
+    co = get_vertex_co_array(data)
+    loop_vertex = get_loop_vertex_array(data)
+    key = (data.as_pointer(), axis, distance, hashlib.blake2b(co.tobytes(), digest_size=16).digest(), hashlib.blake2b(loop_vertex.tobytes(), digest_size=16).digest())
+    if mirror_cache["key"] != key:
+        mirror_cache["key"] = None
+        starts, totals, selected = get_polygon_arrays(data)
+        loops = find_mirror_loops(find_mirror_vertices(co, MIRROR_AXES[axis], distance), loop_vertex, starts, totals)
+        # the positive side wins. on the plane the lower loop index wins
+        side = co[loop_vertex, MIRROR_AXES[axis]]
+        index = np.arange(len(loops))
+        mirror_cache["master"] = (side > distance) | ((np.abs(side) <= distance) & (index < loops))
+        mirror_cache["paired"] = np.flatnonzero((loops >= 0) & (loops != index))
+        mirror_cache["loops"] = loops
+        mirror_cache["key"] = key
+    return mirror_cache["loops"], mirror_cache["paired"], mirror_cache["master"]
+
+# copy the reflected normals of the edited loops to their mirror loops with one gather
+# returns the affected and changed loops. require Object mode, Edit mode is restored on error
+def mirror_loop_normals(data, normals, edited, mirror):
+    if mirror == None:
+        return 0, 0
+    axis, distance = mirror
+    try:
+        loops, paired, master = get_mirror_loop_array(data, axis, distance)
+    except ValueError:
+        bpy.ops.object.mode_set(mode='EDIT')
+        raise
+
+    source = paired[edited[paired]]
+    target = loops[source]
+    keep = ~edited[target] | master[source]
+    source, target = source[keep], target[keep]
+    values = normals[source]
+    values[:, MIRROR_AXES[axis]] *= -1.0
+    changed = count_changed_normals(normals[target], values)
+    normals[target] = values
+    return len(target), changed
+
 #---------------------------------------------------------------function body----------------------------------------------------------------------
-def smooth_selected_normals(data):
+# all edits read the loop normals into one float32 buffer, change the affected loops in place and write once
+# they return True if the normals were written
+
+def smooth_selected_normals(data, workers=1, mirror=None):
     bpy.ops.object.mode_set(mode='OBJECT')
-    normals = get_loop_normals(data)
-    out_normals = copy.deepcopy(normals)  
-    vnormals = get_vertex_normals(data)
-    to_loops = create_loop_table(data)  
-    
-    #create edge table for get active normal
-    edges = [[] for row in range(len(data.vertices))]
-    for e in data.edges:
-        vs = e.vertices
-        edges[vs[0]].append(vs[1])
-        edges[vs[1]].append(vs[0])
-        
-    #smooth normals
-    selected = [v for v in data.vertices if v.select]
-    for v in selected:
-        cn = mathutils.Vector(vnormals[v.index])
-        for e in edges[v.index]:
-            cn += vnormals[e]
-        
-        cn.normalize()
-        for f in to_loops[v.index]:
-            out_normals[f] = cn
-        
-    data.normals_split_custom_set(out_normals)
+    loop_normals, loop_vertex, vnormals, offsets, neighbours = read_smooth_arrays(data)
+    selected = get_vertex_selection_array(data)
+    indices = np.flatnonzero(selected)
+
+    # vnormals is not needed after smoothing, so the result is stored in place
+    vnormals[indices] = smooth_vertex_normals_sharded(vnormals, offsets, neighbours, indices, workers)
+    del offsets, neighbours, indices
+    mask = selected[loop_vertex]
+    affected, changed = assign_loop_normals(loop_normals, mask, lambda loops: vnormals[loop_vertex[loops]])
+    mirrored = mirror_loop_normals(data, loop_normals, mask, mirror)
+    affected, changed = affected + mirrored[0], changed + mirrored[1]
+
+    written = commit_loop_normals(data, loop_normals, affected, changed)
     bpy.ops.object.mode_set(mode='EDIT')
+    return written
+
+def smooth_bilateral_normals(data, iterations=1, sigma_distance=1.0, sigma_angle=math.radians(30), mirror=None):
+    bpy.ops.object.mode_set(mode='OBJECT')
+    loop_normals, loop_vertex, vnormals, offsets, neighbours = read_smooth_arrays(data)
+    selected = get_vertex_selection_array(data)
+    indices = np.flatnonzero(selected)
+
+    vnormals[indices] = bilateral_vertex_normals_array(vnormals, get_vertex_co_array(data), offsets, neighbours, indices, iterations, sigma_distance, sigma_angle)
+    del offsets, neighbours, indices
+    mask = selected[loop_vertex]
+    affected, changed = assign_loop_normals(loop_normals, mask, lambda loops: vnormals[loop_vertex[loops]])
+    mirrored = mirror_loop_normals(data, loop_normals, mask, mirror)
+    affected, changed = affected + mirrored[0], changed + mirrored[1]
+
+    written = commit_loop_normals(data, loop_normals, affected, changed)
+    bpy.ops.object.mode_set(mode='EDIT')
+    return written
 
 def restore_selected_normals(data):
     bpy.ops.object.mode_set(mode='OBJECT')
-    normals = get_loop_normals(data)
-    to_loops = create_loop_table(data)
-    
-    selected = [v for v in data.vertices if v.select]
-    for s in selected:
-        for f in to_loops[s.index]:
-            normals[f] = s.normal
-            
-    data.normals_split_custom_set(normals)
+    loop_normals = get_loop_normals_array(data)
+    loop_vertex = get_loop_vertex_array(data)
+    vnormals = get_vertex_normal_array(data)
+
+    mask = get_vertex_selection_array(data)[loop_vertex]
+    affected, changed = assign_loop_normals(loop_normals, mask, lambda loops: vnormals[loop_vertex[loops]])
+
+    written = commit_loop_normals(data, loop_normals, affected, changed)
     bpy.ops.object.mode_set(mode='EDIT')
+    return written
 
-def set_same_normal(data, normal):
+def set_same_normal(data, normal, mirror=None):
     bpy.ops.object.mode_set(mode='OBJECT')
-    normals = get_loop_normals(data)  
-    to_loops = create_loop_table(data)
-        
-    #update normals
-    selected = [v for v in data.vertices if v.select]
-    for v in selected:
-        for f in to_loops[v.index]:
-            normals[f] = normal
-        
-    data.normals_split_custom_set(normals)
+    loop_normals = get_loop_normals_array(data)
+
+    mask = get_vertex_selection_array(data)[get_loop_vertex_array(data)]
+    affected, changed = assign_loop_normals(loop_normals, mask, normal)
+    mirrored = mirror_loop_normals(data, loop_normals, mask, mirror)
+    affected, changed = affected + mirrored[0], changed + mirrored[1]
+
+    written = commit_loop_normals(data, loop_normals, affected, changed)
     bpy.ops.object.mode_set(mode='EDIT')
+    return written
    
-def set_loop_normal(data, normal, loop_index):
+def set_loop_normal(data, normal, loop_index, mirror=None):
     bpy.ops.object.mode_set(mode='OBJECT')
-    normals = get_loop_normals(data)  
-        
-    #update normals
-    selected = [l for l in loop_index]
-    for s in selected:
-        normals[s] = normal
+    loop_normals = get_loop_normals_array(data)
+
+    mask = np.zeros(len(loop_normals), dtype=bool)
+    mask[np.asarray(loop_index, dtype=np.int64)] = True
+    affected, changed = assign_loop_normals(loop_normals, mask, normal)
+    mirrored = mirror_loop_normals(data, loop_normals, mask, mirror)
+    affected, changed = affected + mirrored[0], changed + mirrored[1]
 
-    data.normals_split_custom_set(normals)
+    written = commit_loop_normals(data, loop_normals, affected, changed)
     bpy.ops.object.mode_set(mode='EDIT')
+    return written
 
-def set_face_normal(data):
+def set_face_normal(data, mirror=None):
     bpy.ops.object.mode_set(mode='OBJECT')
-    normals = get_loop_normals(data)
+    loop_normals = get_loop_normals_array(data)
+    starts, totals, selected = get_polygon_arrays(data)
+    pnormals = get_polygon_normal_array(data)
 
-    selected = [p for p in data.polygons if p.select]
-    for s in selected:
-        for i in range( s.loop_start, s.loop_start + s.loop_total ):
-            normals[i] = s.normal      
-    
-    data.normals_split_custom_set(normals)
+    mask = get_polygon_loop_mask(starts, totals, selected, len(loop_normals))
+    affected, changed = assign_loop_normals(loop_normals, mask, lambda loops: pnormals[get_loop_polygons(starts, loops)])
+    mirrored = mirror_loop_normals(data, loop_normals, mask, mirror)
+    affected, changed = affected + mirrored[0], changed + mirrored[1]
+
+    written = commit_loop_normals(data, loop_normals, affected, changed)
+    bpy.ops.object.mode_set(mode='EDIT')
+    return written
+
+# sum of vectors per label
+def sum_by_label(vectors, labels, count):
+    sums = np.empty((count, 3), dtype=np.float64)
+    for k in range(3):
+        sums[:, k] = np.bincount(labels, weights=vectors[:, k], minlength=count)
+    return sums
+
+# every connected island of the selection gets its own averaged normal
+# weighting is 'EQUAL' (mean of the current vertex normals) or 'AREA' (area weighted face normals)
+def set_island_normals(data, weighting='EQUAL'):
+    bpy.ops.object.mode_set(mode='OBJECT')
+    selected = get_vertex_selection_array(data)
+    edges = get_edge_array(data)
+    labels = label_components(len(data.vertices), edges[selected[edges[:, 0]] & selected[edges[:, 1]]])
+    del edges
+
+    loop_normals = get_loop_normals_array(data)
+    loop_vertex = get_loop_vertex_array(data)
+    if weighting == 'AREA':
+        starts, totals, _ = get_polygon_arrays(data)
+        vectors = get_area_weighted_normals_array(get_vertex_co_array(data), loop_vertex, starts, totals, normalize=False)
+    else:
+        vectors = get_average_vertex_normals_array(loop_normals, loop_vertex, len(data.vertices))
+
+    indices = np.flatnonzero(selected)
+    island_normals = normalize_array(sum_by_label(vectors[indices], labels[indices], len(data.vertices)))
+    affected, changed = assign_loop_normals(loop_normals, selected[loop_vertex], lambda loops: island_normals[labels[loop_vertex[loops]]])
+
+    written = commit_loop_normals(data, loop_normals, affected, changed)
+    bpy.ops.object.mode_set(mode='EDIT')
+    return written
+
+# blend the selected normals from start_normal to end_normal
+# mode is 'AXIS' (projection on the line between the marked vertices), 'GEODESIC' (path length over the
+# selected edges) or 'EDGE_RING' (number of edge rings). t is the distance to the start over the sum of both distances
+def set_gradient_normals(data, start_normal, end_normal, start_index, end_index, mode='AXIS'):
+    bpy.ops.object.mode_set(mode='OBJECT')
+    count = len(data.vertices)
+    if not (0 <= start_index < count and 0 <= end_index < count):
+        bpy.ops.object.mode_set(mode='EDIT')
+        raise ValueError("Mark the start and end vertices")
+
+    selected = get_vertex_selection_array(data)
+    co = get_vertex_co_array(data).astype(np.float64)
+    if mode == 'AXIS':
+        axis = co[end_index] - co[start_index]
+        length = float(np.dot(axis, axis))
+        t = np.clip((co - co[start_index]) @ axis / length, 0.0, 1.0) if length > 0.0 else np.zeros(count)
+        reach = selected
+    else:
+        selected[[start_index, end_index]] = True
+        edges = get_edge_array(data)
+        edges = edges[selected[edges[:, 0]] & selected[edges[:, 1]]]
+        lengths = np.linalg.norm(co[edges[:, 0]] - co[edges[:, 1]], axis=1) if mode == 'GEODESIC' else np.ones(len(edges))
+        adjacency = create_weighted_adjacency_array(edges, lengths, count)
+        to_start = get_edge_distance_array(*adjacency, [start_index])
+        to_end = get_edge_distance_array(*adjacency, [end_index])
+        del adjacency
+        reach = selected & (np.isfinite(to_start) | np.isfinite(to_end))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            t = to_start / (to_start + to_end)
+        t[np.isinf(to_start)] = 1.0
+        t[np.isinf(to_end)] = 0.0
+        t[np.isnan(t)] = 0.0
+
+    start_normal = normalize_array(np.array([start_normal], dtype=np.float64))[0]
+    end_normal = normalize_array(np.array([end_normal], dtype=np.float64))[0]
+    indices = np.flatnonzero(reach)
+    vnormals = np.zeros((count, 3), dtype=np.float32)
+    vnormals[indices] = slerp_array(start_normal, end_normal, t[indices])
+
+    loop_normals = get_loop_normals_array(data)
+    loop_vertex = get_loop_vertex_array(data)
+    affected, changed = assign_loop_normals(loop_normals, reach[loop_vertex], lambda loops: vnormals[loop_vertex[loops]])
+
+    written = commit_loop_normals(data, loop_normals, affected, changed)
     bpy.ops.object.mode_set(mode='EDIT')
+    return written
+
+# normals of an analytic primitive in the local space of the empty
+# sphere: radial. cylinder: radial around local Z. capsule: from the segment z = -1..1. plane: local Z
+def get_shape_normals_array(points, shape):
+    normals = np.array(points, dtype=np.float64)
+    if shape == 'CYLINDER':
+        normals[:, 2] = 0.0
+    elif shape == 'CAPSULE':
+        normals[:, 2] -= np.clip(normals[:, 2], -1.0, 1.0)
+    elif shape == 'PLANE':
+        normals[:] = (0.0, 0.0, 1.0)
+    return normals
+
+# blend the selected normals toward the normals of a primitive placed by the empty
+# the weight of each vertex is factor times the mask (attribute or vertex group) if given
+# require Edit mode
+def set_shape_normals(ob, empty, shape, factor=1.0, mask_name=""):
+    data = ob.data
+    bpy.ops.object.mode_set(mode='OBJECT')
+    weights = get_vertex_weight_array(ob, mask_name) if mask_name else None
+    if mask_name and weights is None:
+        bpy.ops.object.mode_set(mode='EDIT')
+        raise ValueError("Mask not found: " + mask_name)
+
+    # object space -> empty space. normals go back with the transpose of its 3x3 part
+    matrix = np.linalg.inv(np.array(empty.matrix_world, dtype=np.float64)) @ np.array(ob.matrix_world, dtype=np.float64)
+    co = get_vertex_co_array(data) @ matrix[:3, :3].T + matrix[:3, 3]
+    selected = get_vertex_selection_array(data)
+    indices = np.flatnonzero(selected)
+    vnormals = np.zeros((len(co), 3), dtype=np.float32)
+    vnormals[indices] = normalize_array(get_shape_normals_array(co[indices], shape) @ matrix[:3, :3])
+    vweights = np.full(len(co), factor, dtype=np.float32) if weights is None else weights * factor
+    selected &= vweights > 0.0
+
+    loop_normals = get_loop_normals_array(data)
+    loop_vertex = get_loop_vertex_array(data)
+    def blend(loops):
+        v = loop_vertex[loops]
+        w = vweights[v][:, None]
+        return loop_normals[loops]*(1.0 - w) + vnormals[v]*w
+    affected, changed = assign_loop_normals(loop_normals, selected[loop_vertex], blend)
+
+    written = commit_loop_normals(data, loop_normals, affected, changed)
+    bpy.ops.object.mode_set(mode='EDIT')
+    return written
+
+# select the vertices or faces with a loop normal more than threshold (radians) away from
+# the default shading normal ('DEFAULT'), the face normal ('FACE') or direction ('DIRECTION')
+# NaN and zero length normals always count. returns the number of selected elements
+# require Edit mode
+def select_by_deviation(data, domain, reference, threshold, direction=None, extend=False):
+    bpy.ops.object.mode_set(mode='OBJECT')
+    loop_normals = normalize_array(get_loop_normals_array(data))
+    loop_vertex = get_loop_vertex_array(data)
+    starts, totals, polygon_selected = get_polygon_arrays(data)
+
+    if reference == 'DEFAULT':
+        target = get_default_loop_normals_array(data)
+    elif reference == 'FACE':
+        target = get_polygon_normal_array(data)[get_loop_polygon_array(starts, totals)]
+    else:
+        target = normalize_array(np.array([direction], dtype=np.float32))
+    deviates = ~(np.einsum('ij,ij->i', loop_normals, np.broadcast_to(target, loop_normals.shape)) >= math.cos(threshold))
+
+    if domain == 'FACE':
+        hit = np.logical_or.reduceat(deviates, starts) if len(starts) else np.zeros(0, dtype=bool)
+        if extend:
+            hit |= polygon_selected
+        vertex_selected = np.zeros(len(data.vertices), dtype=bool)
+        vertex_selected[loop_vertex[get_polygon_loop_mask(starts, totals, hit, len(loop_vertex))]] = True
+        set_selection_arrays(data, vertex_selected, hit)
+    else:
+        hit = np.zeros(len(data.vertices), dtype=bool)
+        hit[loop_vertex[deviates]] = True
+        if extend:
+            hit |= get_vertex_selection_array(data)
+        set_selection_arrays(data, hit)
+
+    bpy.ops.object.mode_set(mode='EDIT')
+    return int(np.count_nonzero(hit))
+
+# custom normals are stored as two shorts per element
+CUSTOM_NORMAL_BYTES = 4
+# per vertex custom normals are stored on the point domain since 4.5. before that they are expanded to corners
+POINT_CUSTOM_NORMAL_VERSION = (4, 5, 0)
+
+# drop the custom normals that only repeat the default shading
+# returns (result, bytes saved). result is 'NONE' (no custom normals), 'CLEARED' (all loops match the default
+# within epsilon, the layer is removed), 'VERTEX' (corners of each vertex agree, written per vertex) or 'KEPT'
+# the default includes the splits at sharp edges and, before 4.1, at the auto smooth angle
+# require Object mode
+def compact_custom_normals(data, epsilon=CHANGE_EPSILON):
+    if not data.has_custom_normals:
+        return ('NONE', 0)
+    loop_normals = normalize_array(get_loop_normals_array(data))
+    loop_vertex = get_loop_vertex_array(data)
+    loop_bytes = len(loop_normals)*CUSTOM_NORMAL_BYTES
+    cos = math.cos(epsilon)
+
+    default = get_default_loop_normals_array(data)
+    matches = np.einsum('ij,ij->i', loop_normals, default) >= cos
+    del default
+    if matches.all():
+        bpy.ops.mesh.customdata_custom_splitnormals_clear()
+        return ('CLEARED', loop_bytes)
+
+    if bpy.app.version < POINT_CUSTOM_NORMAL_VERSION:
+        return ('KEPT', 0)
+
+    # every corner within epsilon of the first corner of its vertex
+    first = np.full(len(data.vertices), -1, dtype=np.int64)
+    first[loop_vertex[::-1]] = np.arange(len(loop_vertex)-1, -1, -1)
+    agrees = np.einsum('ij,ij->i', loop_normals, loop_normals[first[loop_vertex]]) >= cos
+    if not agrees.all():
+        return ('KEPT', 0)
+
+    vnormals = np.zeros((len(data.vertices), 3), dtype=np.float32)
+    has_loop = first >= 0
+    vnormals[has_loop] = loop_normals[first[has_loop]]
+    data.normals_split_custom_set_from_vertices(vnormals)
+    return ('VERTEX', loop_bytes - len(vnormals)*CUSTOM_NORMAL_BYTES)
+
+# one value per polygon that defines its group
+# source is 'MATERIAL', 'FACE_SET', 'FACE_MAP' (before 4.0) or 'ATTRIBUTE' (a face attribute with one component)
+# buffers match the property type so foreach_get takes the fast path
+ATTRIBUTE_DTYPES = {'INT': np.int32, 'INT8': np.int32, 'BOOLEAN': bool, 'FLOAT': np.float32}
+
+def get_polygon_group_array(data, source, attribute_name=""):
+    if source == 'MATERIAL':
+        values = np.empty(len(data.polygons), dtype=np.int32)
+        data.polygons.foreach_get("material_index", values)
+    elif source == 'FACE_MAP':
+        if not getattr(data, "face_maps", None) or data.face_maps.active == None:
+            raise ValueError("Mesh has no face map")
+        values = np.empty(len(data.polygons), dtype=np.int32)
+        data.face_maps.active.data.foreach_get("value", values)
+    else:
+        name = ".sculpt_face_set" if source == 'FACE_SET' else attribute_name
+        attribute = data.attributes.get(name)
+        if attribute == None or attribute.domain != 'FACE' or attribute.data_type not in ATTRIBUTE_DTYPES:
+            raise ValueError("Mesh has no face attribute " + name)
+        values = np.empty(len(data.polygons), dtype=ATTRIBUTE_DTYPES[attribute.data_type])
+        attribute.data.foreach_get("value", values)
+    return values
+
+# every face group gets one normal on all its loops
+# mode is 'AVERAGE' (mean of the loop normals), 'AREA' (area weighted face normals) or 'DIRECTION' (normal)
+# only groups with a selected face are changed unless all_groups
+def set_group_normals(data, source, mode, attribute_name="", normal=None, all_groups=False):
+    bpy.ops.object.mode_set(mode='OBJECT')
+    try:
+        values = get_polygon_group_array(data, source, attribute_name)
+    except ValueError:
+        bpy.ops.object.mode_set(mode='EDIT')
+        raise
+    keys, groups = np.unique(values, return_inverse=True)
+    groups = groups.ravel()
+    del values
+
+    starts, totals, selected = get_polygon_arrays(data)
+    in_scope = np.ones(len(groups), dtype=bool) if all_groups else np.isin(groups, groups[selected])
+    loop_normals = get_loop_normals_array(data)
+    loop_groups = groups[get_loop_polygon_array(starts, totals)]
+
+    if mode == 'DIRECTION':
+        values = normal
+    else:
+        if mode == 'AREA':
+            vectors = get_polygon_area_vectors_array(get_vertex_co_array(data), get_loop_vertex_array(data), starts, totals)
+            group_normals = normalize_array(sum_by_label(vectors, groups, len(keys)))
+        else:
+            group_normals = normalize_array(sum_by_label(loop_normals, loop_groups, len(keys)))
+        values = lambda loops: group_normals[loop_groups[loops]]
+
+    mask = get_polygon_loop_mask(starts, totals, in_scope, len(loop_normals))
+    affected, changed = assign_loop_normals(loop_normals, mask, values)
+
+    written = commit_loop_normals(data, loop_normals, affected, changed)
+    bpy.ops.object.mode_set(mode='EDIT')
+    return written
+
+# average the normals of selected vertices closer than distance, across islands and the given objects
+# weighting is 'EQUAL' (mean of the current vertex normals) or 'AREA' (area weighted face normals, as if welded)
+# returns (number of unified vertices, True if any object was written)
+# require Object mode
+def unify_coincident_normals(objects, distance, weighting='EQUAL'):
+    points = []
+    vectors = []
+    owners = []
+    for ob in objects:
+        data = ob.data
+        matrix = np.array(ob.matrix_world, dtype=np.float64)
+        indices = np.flatnonzero(get_vertex_selection_array(data))
+        co = get_vertex_co_array(data) @ matrix[:3, :3].T + matrix[:3, 3]
+        loop_vertex = get_loop_vertex_array(data)
+        if weighting == 'AREA':
+            starts, totals, _ = get_polygon_arrays(data)
+            vnormals = get_area_weighted_normals_array(co, loop_vertex, starts, totals, normalize=False)
+        else:
+            vnormals = get_average_vertex_normals_array(get_loop_normals_array(data), loop_vertex, len(data.vertices))
+            vnormals = normalize_array(vnormals @ np.linalg.inv(matrix[:3, :3]))
+        points.append(co[indices])
+        vectors.append(vnormals[indices])
+        owners.append(indices)
+
+    points = np.concatenate(points)
+    vectors = np.concatenate(vectors).astype(np.float64)
+    labels = label_components(len(points), find_close_pairs(points, distance))
+    sizes = np.bincount(labels, minlength=len(points))
+    unified = normalize_array(sum_by_label(vectors, labels, len(points))[labels])
+    shared = sizes[labels] > 1
+
+    count = 0
+    written = False
+    start = 0
+    for ob, indices in zip(objects, owners):
+        end = start + len(indices)
+        data = ob.data
+        matrix = np.array(ob.matrix_world, dtype=np.float64)
+        targets = np.zeros(len(data.vertices), dtype=bool)
+        targets[indices[shared[start:end]]] = True
+        vnormals = np.zeros((len(data.vertices), 3), dtype=np.float32)
+        vnormals[indices] = normalize_array(unified[start:end] @ matrix[:3, :3])
+        start = end
+
+        loop_normals = get_loop_normals_array(data)
+        loop_vertex = get_loop_vertex_array(data)
+        affected, changed = assign_loop_normals(loop_normals, targets[loop_vertex], lambda loops: vnormals[loop_vertex[loops]])
+        written = commit_loop_normals(data, loop_normals, affected, changed) or written
+        count += int(np.count_nonzero(targets))
+
+    # commit_loop_normals sets skipped per object
+    stats["skipped"] = not written
+    return count, written
 
 # BMesh become invalid
 # if there is no active, return None
@@ -209,8 +1260,8 @@ def get_active_normal(context,ob):
         return None
 
     index = active[0]
-    to_loops = create_loop_table(ob.data)
-    loop_normals = get_loop_normals(ob.data)
+    vertex_loops = get_vertex_loops(ob.data, index)
+    calc_normals_split(ob.data)
     loop_index = -1
 
     normal = active[1]
@@ -218,13 +1269,13 @@ def get_active_normal(context,ob):
         #vertex
         if is_split_mode():
             loop_index = get_loop_index()
-            if loop_index < len(to_loops[index]):
-                loop_index = to_loops[index][loop_index]
-                normal = ob.data.loops[loop_index].normal
+            if loop_index < len(vertex_loops):
+                loop_index = vertex_loops[loop_index]
+                normal = get_loop_normal(ob.data, loop_index)
         else:
-            for f in to_loops[index]:
+            for f in vertex_loops:
                 if ob.data.loops[f].vertex_index==index:
-                    normal = ob.data.loops[f].normal
+                    normal = get_loop_normal(ob.data, f)
                     loop_index = ob.data.loops[f].index
                     break
         
@@ -239,7 +1290,7 @@ def update_active_normal(context, ob):
     if is_split_mode():
         loop_index = normal[2]
         if loop_index != -1:
-            normal = ob.data.loops[loop_index].normal
+            normal = get_loop_normal(ob.data, loop_index)
         else:
             normal = normal[0]
     else:
@@ -247,35 +1298,830 @@ def update_active_normal(context, ob):
 
     scn.ne_type_normal = normal
 
+# returns True if the normals were written
 def set_normal_to_selected(context, normal):
     o = context.active_object
+    written = False
     if not is_split_mode():
-        set_same_normal(o.data, normal)
+        written = set_same_normal(o.data, normal, get_mirror())
     else:
         bpy.ops.object.mode_set(mode='EDIT')
         active = get_active_vertex_ed(o)
         if active == None:
-            return
+            return False
 
         index = active[0]
         if bpy.context.scene.tool_settings.mesh_select_mode[0]:
             # split vertex mode
             loop_index = get_loop_index()
-            to_loops = create_loop_table(o.data)
-            if loop_index < len(to_loops[index]):
-                loop_index = to_loops[index][loop_index]
-                set_loop_normal(o.data, normal, [loop_index])
+            vertex_loops = get_vertex_loops(o.data, index)
+            if loop_index < len(vertex_loops):
+                loop_index = vertex_loops[loop_index]
+                written = set_loop_normal(o.data, normal, [loop_index], get_mirror())
         if bpy.context.scene.tool_settings.mesh_select_mode[2]:
             # split face mode
-            selected = [p for p in o.data.polygons if p.select]
-            loop_index = []
-            for s in selected:
-                for i in range( s.loop_start, s.loop_start + s.loop_total ):
-                    loop_index.append(i)  
-            set_loop_normal(o.data, normal, loop_index)
+            starts, totals, selected = get_polygon_arrays(o.data)
+            loop_index = np.flatnonzero(get_polygon_loop_mask(starts, totals, selected, len(o.data.loops)))
+            written = set_loop_normal(o.data, normal, loop_index, get_mirror()) or written
 
     bpy.ops.object.mode_set(mode='EDIT')        
+    return written
   
+#----------------------------------------------------------presets-----------------------------------------------------
+# a preset is <dir>/<mesh>/<name>.npy with the loop normals (memory mapped on load)
+# and <name>.npz with the topology fingerprint, the loop -> vertex table and the saved loop indices
+PRESET_DEFAULT_DIR = "//normal_presets"
+
+def get_preset_dir(data):
+    base = bpy.context.scene.dskjal_sn_props.ne_preset_dir or PRESET_DEFAULT_DIR
+    return os.path.join(resolve_blend_path(base), bpy.path.clean_name(data.name))
+
+def get_preset_path(data, name):
+    return os.path.join(get_preset_dir(data), bpy.path.clean_name(name))
+
+def get_preset_names(data):
+    folder = get_preset_dir(data)
+    if not os.path.isdir(folder):
+        return []
+    return sorted(f[:-4] for f in os.listdir(folder) if f.endswith(".npy") and os.path.isfile(os.path.join(folder, f[:-4]+".npz")))
+
+def get_topology_fingerprint(data, loop_vertex):
+    return "{}:{}:{}:{}".format(len(data.vertices), len(data.edges), len(data.polygons), hashlib.blake2b(loop_vertex.tobytes(), digest_size=16).hexdigest())
+
+# require Object mode
+def save_normal_preset(data, name, selected_only=False):
+    loop_normals = get_loop_normals_array(data)
+    loop_vertex = get_loop_vertex_array(data)
+    loops = np.flatnonzero(get_vertex_selection_array(data)[loop_vertex]).astype(np.int32) if selected_only else np.empty(0, dtype=np.int32)
+
+    path = get_preset_path(data, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    np.save(path+".npy", loop_normals[loops] if selected_only else loop_normals)
+    np.savez(path+".npz", fingerprint=np.array(get_topology_fingerprint(data, loop_vertex)), loop_vertex=loop_vertex, loops=loops, selected_only=np.array(selected_only))
+    return len(loops) if selected_only else len(loop_normals)
+
+# normals of the preset mapped onto the current loops by vertex index. a vertex takes one of its saved corners
+def remap_preset_normals(normals, saved_loops, saved_vertex, vertex_count):
+    vnormals = np.zeros((vertex_count, 3), dtype=np.float32)
+    has_normal = np.zeros(vertex_count, dtype=bool)
+    for start, end in iter_chunks(len(saved_loops)):
+        v = saved_vertex[saved_loops[start:end]]
+        vnormals[v] = normals[start:end]
+        has_normal[v] = True
+    return vnormals, has_normal
+
+# returns (applied, message). the topology is checked by counts and a hash of the loop -> vertex table
+# mismatched meshes are refused, or remapped by vertex index if remap is True and the vertex count is equal
+# require Object mode
+def load_normal_preset(data, name, remap=False):
+    path = get_preset_path(data, name)
+    if not os.path.isfile(path+".npy") or not os.path.isfile(path+".npz"):
+        return (False, "Preset not found: " + name)
+
+    loop_vertex = get_loop_vertex_array(data)
+    with np.load(path+".npz") as meta:
+        selected_only = bool(meta["selected_only"])
+        fingerprint = str(meta["fingerprint"])
+        same_topology = fingerprint == get_topology_fingerprint(data, loop_vertex)
+        saved_loops = meta["loops"] if selected_only else None
+        saved_vertex = None if same_topology else meta["loop_vertex"]
+    normals = np.load(path+".npy", mmap_mode='r')
+    loop_normals = get_loop_normals_array(data)
+
+    if same_topology:
+        mask = np.zeros(len(loop_normals), dtype=bool)
+        if selected_only:
+            mask[saved_loops] = True
+            # loops are saved in ascending order, so the chunks of the mask line up with the preset rows
+            affected, changed = assign_loop_normals(loop_normals, mask, lambda chunk: normals[np.searchsorted(saved_loops, chunk)])
+        else:
+            mask[:] = True
+            affected, changed = assign_loop_normals(loop_normals, mask, lambda chunk: normals[chunk[0]:chunk[-1]+1])
+    else:
+        if not remap:
+            return (False, "Topology does not match the preset")
+        # the fingerprint starts with the vertex count of the saved mesh
+        if int(fingerprint.split(":")[0]) != len(data.vertices):
+            return (False, "Vertex count does not match the preset")
+        if not selected_only:
+            saved_loops = np.arange(len(saved_vertex))
+        vnormals, has_normal = remap_preset_normals(normals, saved_loops, saved_vertex, len(data.vertices))
+        affected, changed = assign_loop_normals(loop_normals, has_normal[loop_vertex], lambda chunk: vnormals[loop_vertex[chunk]])
+
+    commit_loop_normals(data, loop_normals, affected, changed)
+    return (True, "{} loops loaded".format(affected))
+
+# loop normals of a preset saved on the same topology. loops missing from a selected only preset are NaN
+# require Object mode
+def read_preset_normals(data, name, loop_vertex):
+    path = get_preset_path(data, name)
+    if not os.path.isfile(path+".npy") or not os.path.isfile(path+".npz"):
+        raise ValueError("Preset not found: " + name)
+    with np.load(path+".npz") as meta:
+        if str(meta["fingerprint"]) != get_topology_fingerprint(data, loop_vertex):
+            raise ValueError("Topology does not match the preset")
+        loops = meta["loops"] if bool(meta["selected_only"]) else None
+
+    normals = np.load(path+".npy", mmap_mode='r')
+    if loops is None:
+        return normals
+    full = np.full((len(loop_vertex), 3), np.nan, dtype=np.float32)
+    full[loops] = normals
+    return full
+
+#----------------------------------------------------------interchange-----------------------------------------------------
+# .snrm files are a header followed by tagged blocks of raw little-endian arrays
+#   header: magic, version, loop count, vertex count
+#   block:  tag, item count, components per item, dtype ('f' float32 or 'i' int32), data
+# blocks: NRML loop normals, LVTX loop -> vertex, LPOS corner positions, LUV0 corner uvs
+INTERCHANGE_MAGIC = b"SNRM"
+INTERCHANGE_VERSION = 1
+INTERCHANGE_HEADER = struct.Struct("<4sIII")
+INTERCHANGE_BLOCK = struct.Struct("<4sQIc3x")
+INTERCHANGE_DTYPES = {b"f": np.dtype("<f4"), b"i": np.dtype("<i4")}
+
+def write_interchange_block(f, tag, count, width, code, chunks):
+    f.write(INTERCHANGE_BLOCK.pack(tag, count, width, code))
+    dtype = INTERCHANGE_DTYPES[code]
+    for chunk in chunks:
+        f.write(np.ascontiguousarray(chunk, dtype=dtype).tobytes())
+
+# returns {tag: memmap}
+def read_interchange_file(path):
+    blocks = {}
+    with open(path, "rb") as f:
+        magic, version, loop_count, vertex_count = INTERCHANGE_HEADER.unpack(f.read(INTERCHANGE_HEADER.size))
+        if magic != INTERCHANGE_MAGIC or version > INTERCHANGE_VERSION:
+            raise ValueError("Not a normal interchange file")
+
+        offset = INTERCHANGE_HEADER.size
+        size = os.fstat(f.fileno()).st_size
+        while offset + INTERCHANGE_BLOCK.size <= size:
+            f.seek(offset)
+            tag, count, width, code = INTERCHANGE_BLOCK.unpack(f.read(INTERCHANGE_BLOCK.size))
+            offset += INTERCHANGE_BLOCK.size
+            dtype = INTERCHANGE_DTYPES[code]
+            blocks[tag] = np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=(count, width)) if count > 0 else np.empty((0, width), dtype=dtype)
+            offset += count * width * dtype.itemsize
+
+    return blocks
+
+# uvs of the named or the active uv map. None if the mesh has no such uv map
+def get_loop_uv_array(data, name=""):
+    layer = data.uv_layers.get(name) if name else data.uv_layers.active
+    if layer == None:
+        return None
+    uv = np.empty(len(data.loops)*2, dtype=np.float32)
+    layer.data.foreach_get("uv", uv)
+    return uv.reshape(-1, 2)
+
+# require Object mode
+def export_normals(data, path, use_position=True, use_uv=True):
+    loop_normals = get_loop_normals_array(data)
+    loop_vertex = get_loop_vertex_array(data)
+    count = len(loop_normals)
+    chunks = lambda array: (array[start:end] for start, end in iter_chunks(count))
+
+    with open(path, "wb") as f:
+        f.write(INTERCHANGE_HEADER.pack(INTERCHANGE_MAGIC, INTERCHANGE_VERSION, count, len(data.vertices)))
+        write_interchange_block(f, b"NRML", count, 3, b"f", chunks(loop_normals))
+        write_interchange_block(f, b"LVTX", count, 1, b"i", chunks(loop_vertex))
+        if use_position:
+            co = get_vertex_co_array(data)
+            write_interchange_block(f, b"LPOS", count, 3, b"f", (co[loop_vertex[start:end]] for start, end in iter_chunks(count)))
+        uv = get_loop_uv_array(data) if use_uv else None
+        if uv is not None:
+            write_interchange_block(f, b"LUV0", count, 2, b"f", chunks(uv))
+
+    return count
+
+# one hash per corner from its quantized position and uv
+def get_corner_keys(positions, uvs, precision):
+    q = np.round(np.asarray(positions, dtype=np.float64) / precision).astype(np.int64)
+    keys = q[:, 0]*np.int64(73856093) ^ q[:, 1]*np.int64(19349663) ^ q[:, 2]*np.int64(83492791)
+    if uvs is not None:
+        q = np.round(np.asarray(uvs, dtype=np.float64) / precision).astype(np.int64)
+        keys ^= q[:, 0]*np.int64(2654435761) ^ q[:, 1]*np.int64(40503)
+    return keys
+
+# file row of each loop matched by position (and uv if both sides have it). -1 if not found
+def match_corners(blocks, data, loop_vertex, precision):
+    file_uv = blocks.get(b"LUV0")
+    uv = get_loop_uv_array(data) if file_uv is not None else None
+    if uv is None:
+        file_uv = None
+
+    file_keys = np.empty(len(blocks[b"LPOS"]), dtype=np.int64)
+    for start, end in iter_chunks(len(file_keys)):
+        file_keys[start:end] = get_corner_keys(blocks[b"LPOS"][start:end], None if file_uv is None else file_uv[start:end], precision)
+    rows = np.full(len(loop_vertex), -1, dtype=np.int64)
+    if len(file_keys) == 0:
+        return rows
+    order = np.argsort(file_keys, kind='stable')
+    file_keys = file_keys[order]
+
+    co = get_vertex_co_array(data)
+    for start, end in iter_chunks(len(loop_vertex)):
+        keys = get_corner_keys(co[loop_vertex[start:end]], None if uv is None else uv[start:end], precision)
+        pos = np.minimum(np.searchsorted(file_keys, keys), len(file_keys)-1)
+        found = file_keys[pos] == keys
+        rows[start:end][found] = order[pos[found]]
+
+    return rows
+
+# match is 'LOOP' (loop order), 'POSITION' (position + uv hash) or 'AUTO'
+# returns (applied, message)
+# require Object mode
+def import_normals(data, path, match='AUTO', precision=1e-4):
+    try:
+        blocks = read_interchange_file(path)
+    except (OSError, ValueError, KeyError, struct.error) as e:
+        return (False, str(e))
+    if b"NRML" not in blocks:
+        return (False, "File has no normals")
+
+    normals = blocks[b"NRML"]
+    loop_vertex = get_loop_vertex_array(data)
+    loop_normals = get_loop_normals_array(data)
+    same_order = len(normals) == len(loop_normals) and (b"LVTX" not in blocks or np.array_equal(blocks[b"LVTX"][:, 0], loop_vertex))
+    if match == 'AUTO':
+        match = 'LOOP' if same_order else 'POSITION'
+
+    if match == 'LOOP':
+        if len(normals) != len(loop_normals):
+            return (False, "Loop count does not match")
+        mask = np.ones(len(loop_normals), dtype=bool)
+        affected, changed = assign_loop_normals(loop_normals, mask, lambda loops: normals[loops[0]:loops[-1]+1])
+    else:
+        if b"LPOS" not in blocks:
+            return (False, "File has no positions")
+        rows = match_corners(blocks, data, loop_vertex, precision)
+        affected, changed = assign_loop_normals(loop_normals, rows >= 0, lambda loops: normals[rows[loops]])
+
+    commit_loop_normals(data, loop_normals, affected, changed)
+    return (True, "{}/{} loops matched".format(affected, len(loop_normals)))
+
+#----------------------------------------------------------normal map-----------------------------------------------------
+# images are read and written as one float32 buffer of shape (height, width, channels), bottom row first
+# colors map to vectors by rgb*2-1. tangent space is the MikkTSpace tangent of the uv map made orthogonal
+# to the default shading normals (OpenGL, +Y up), so baking and applying round trip
+BAKE_BACKGROUND = (0.5, 0.5, 1.0, 1.0)
+
+# require loaded pixels
+def get_image_pixels_array(image):
+    width, height = image.size
+    if width == 0 or height == 0:
+        raise ValueError("Image has no pixels: " + image.name)
+    pixels = np.empty(width*height*image.channels, dtype=np.float32)
+    image.pixels.foreach_get(pixels)
+    return pixels.reshape(height, width, image.channels)
+
+# bilinear sample at each uv. the image repeats outside 0..1
+def sample_image_array(pixels, uv):
+    height, width = pixels.shape[:2]
+    x = uv[:, 0]*width - 0.5
+    y = uv[:, 1]*height - 0.5
+    x0 = np.floor(x)
+    y0 = np.floor(y)
+    fx = (x - x0)[:, None]
+    fy = (y - y0)[:, None]
+    x0 = x0.astype(np.int64) % width
+    y0 = y0.astype(np.int64) % height
+    x1 = (x0 + 1) % width
+    y1 = (y0 + 1) % height
+    bottom = pixels[y0, x0]*(1.0 - fx) + pixels[y0, x1]*fx
+    top = pixels[y1, x0]*(1.0 - fx) + pixels[y1, x1]*fx
+    return bottom*(1.0 - fy) + top*fy
+
+# (tangent, bitangent sign) of each loop for the uv map. the mesh must be triangles and quads
+# require Object mode
+def get_loop_tangent_arrays(data, uv_name=""):
+    layer = data.uv_layers.get(uv_name) if uv_name else data.uv_layers.active
+    if layer == None:
+        raise ValueError("Mesh has no uv map")
+    try:
+        data.calc_tangents(uvmap=layer.name)
+    except RuntimeError as e:
+        raise ValueError(str(e))
+    tangents = np.empty(len(data.loops)*3, dtype=np.float32)
+    signs = np.empty(len(data.loops), dtype=np.float32)
+    data.loops.foreach_get("tangent", tangents)
+    data.loops.foreach_get("bitangent_sign", signs)
+    data.free_tangents()
+    return tangents.reshape(-1, 3), signs
+
+# (tangent, bitangent) orthonormal to the normals
+def get_tangent_basis_arrays(normals, tangents, signs):
+    t = normalize_array(tangents - normals*np.einsum('ij,ij->i', normals, tangents)[:, None])
+    return t, np.cross(normals, t)*signs[:, None]
+
+# selected normals from the image at their uvs
+# space is 'TANGENT' (relative to the default normals and the tangents of the uv map) or 'OBJECT'
+# flip_y reads DirectX maps (-Y green)
+# require Edit mode
+def apply_normal_map(data, image, space='TANGENT', uv_name="", flip_y=False):
+    bpy.ops.object.mode_set(mode='OBJECT')
+    try:
+        pixels = get_image_pixels_array(image)
+        uv = get_loop_uv_array(data, uv_name)
+        if uv is None:
+            raise ValueError("Mesh has no uv map")
+        if space == 'TANGENT':
+            tangents, signs = get_loop_tangent_arrays(data, uv_name)
+    except ValueError:
+        bpy.ops.object.mode_set(mode='EDIT')
+        raise
+
+    loop_normals = get_loop_normals_array(data)
+    loop_vertex = get_loop_vertex_array(data)
+    if space == 'TANGENT':
+        base = get_default_loop_normals_array(data)
+    mask = get_vertex_selection_array(data)[loop_vertex]
+    def sample(loops):
+        vectors = sample_image_array(pixels, uv[loops])[:, :3]*2.0 - 1.0
+        if flip_y:
+            vectors[:, 1] = -vectors[:, 1]
+        if space != 'TANGENT':
+            return vectors
+        n = base[loops]
+        t, b = get_tangent_basis_arrays(n, tangents[loops], signs[loops])
+        return t*vectors[:, 0:1] + b*vectors[:, 1:2] + n*vectors[:, 2:3]
+    affected, changed = assign_loop_normals(loop_normals, mask, sample)
+
+    written = commit_loop_normals(data, loop_normals, affected, changed)
+    bpy.ops.object.mode_set(mode='EDIT')
+    return written
+
+# start + 0..count-1 of every span, and the span of each
+def expand_spans(starts, counts):
+    spans = np.repeat(np.arange(len(counts)), counts)
+    return spans, starts[spans] + np.arange(len(spans)) - np.repeat(np.cumsum(counts) - counts, counts)
+
+# rasterize uv triangles into the rows row_start..row_end of pixels, interpolating values at the corners
+# the barycentric weights are affine in the pixel position. each row of a triangle is clipped to the span
+# where all three are positive, so only covered pixels are visited
+# triangles are processed in batches of about CHUNK_SIZE*16 pixels
+def rasterize_triangles(pixels, row_start, row_end, tri_uv, tri_values):
+    height, width = pixels.shape[:2]
+    p = tri_uv.astype(np.float64)*(width, height) - 0.5
+    x0 = np.maximum(np.floor(p[:, :, 0].min(axis=1)), 0)
+    x1 = np.minimum(np.ceil(p[:, :, 0].max(axis=1)), width-1)
+    y0 = np.maximum(np.floor(p[:, :, 1].min(axis=1)), row_start).astype(np.int64)
+    y1 = np.minimum(np.ceil(p[:, :, 1].max(axis=1)), row_end-1).astype(np.int64)
+    e1 = p[:, 1] - p[:, 0]
+    e2 = p[:, 2] - p[:, 0]
+    area = e1[:, 0]*e2[:, 1] - e2[:, 0]*e1[:, 1]
+    keep = np.flatnonzero((x0 <= x1) & (y0 <= y1) & (np.abs(area) > 1e-12))
+    p, e1, e2, area = p[keep], e1[keep], e2[keep], area[keep]
+    x0, y0, x1, y1 = x0[keep], y0[keep], x1[keep], y1[keep]
+
+    # w1, w2, w0 = plane[:, i] . (x, y, 1)
+    plane = np.empty((len(keep), 3, 3), dtype=np.float64)
+    plane[:, 0, 0] = e2[:, 1] / area
+    plane[:, 0, 1] = -e2[:, 0] / area
+    plane[:, 1, 0] = -e1[:, 1] / area
+    plane[:, 1, 1] = e1[:, 0] / area
+    plane[:, :2, 2] = -(plane[:, :2, 0]*p[:, 0, 0:1] + plane[:, :2, 1]*p[:, 0, 1:2])
+    plane[:, 2] = -plane[:, 0] - plane[:, 1]
+    plane[:, 2, 2] += 1.0
+    values = tri_values[keep]
+    values[:, 1:] -= values[:, 0:1]
+    del p, e1, e2, area
+
+    rows = np.cumsum(y1 - y0 + 1)
+    bounds = np.searchsorted(rows, np.arange(0, rows[-1] if len(rows) else 0, CHUNK_SIZE), side='right')
+    for start, end in zip(bounds, np.append(bounds[1:], len(keep))):
+        if start == end:
+            continue
+        tris, y = expand_spans(y0[start:end], y1[start:end] - y0[start:end] + 1)
+        tris += start
+        # w = a*x + k on the row. clip [lo, hi] to w >= 0 for the three weights
+        a = plane[tris, :, 0]
+        k = plane[tris, :, 1]*y[:, None] + plane[tris, :, 2]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            bound = (-1e-6 - k) / a
+        lo = np.max(np.where(a > 0.0, bound, -np.inf), axis=1, initial=0.0)
+        hi = np.min(np.where(a < 0.0, bound, np.inf), axis=1, initial=width-1)
+        lo = np.ceil(np.maximum(lo, x0[tris])).astype(np.int64)
+        hi = np.floor(np.minimum(hi, x1[tris])).astype(np.int64)
+        counts = np.where(((a != 0.0) | (k >= -1e-6)).all(axis=1), np.maximum(hi - lo + 1, 0), 0)
+
+        spans, x = expand_spans(lo, counts)
+        w1 = (a[spans, 0]*x + k[spans, 0])[:, None]
+        w2 = (a[spans, 1]*x + k[spans, 1])[:, None]
+        v = values[tris[spans]]
+        y = y[spans]
+        pixels[y, x, :3] = v[:, 0] + w1*v[:, 1] + w2*v[:, 2]
+        pixels[y, x, 3] = 1.0
+
+# copy filled pixels into empty neighbours, one pixel per step, so seams do not show the background
+def dilate_pixels(pixels, filled, margin):
+    rest = slice(None)
+    shifts = (((slice(1, None), rest), (slice(None, -1), rest)), ((slice(None, -1), rest), (slice(1, None), rest)),
+              ((rest, slice(1, None)), (rest, slice(None, -1))), ((rest, slice(None, -1)), (rest, slice(1, None))))
+    for _ in range(margin):
+        grown = filled.copy()
+        for target, source in shifts:
+            take = filled[source] & ~grown[target]
+            pixels[target][take] = pixels[source][take]
+            grown[target] |= take
+        filled = grown
+
+# bake the custom normals relative to the default normals into image. the mesh must be triangles and quads
+# image rows are split into bands that are rasterized on worker threads
+# returns the number of baked triangles
+# require Object mode
+def bake_normal_map(data, image, uv_name="", margin=2, flip_y=False, workers=1):
+    width, height = image.size
+    if width == 0 or height == 0:
+        raise ValueError("Image has no pixels: " + image.name)
+    uv = get_loop_uv_array(data, uv_name)
+    if uv is None:
+        raise ValueError("Mesh has no uv map")
+    tangents, signs = get_loop_tangent_arrays(data, uv_name)
+    loop_normals = get_loop_normals_array(data)
+    loop_vertex = get_loop_vertex_array(data)
+
+    # custom normals in the tangent space of the default normals, as colors
+    base = get_default_loop_normals_array(data)
+    t, b = get_tangent_basis_arrays(base, tangents, signs)
+    del tangents, signs
+    colors = np.stack((np.einsum('ij,ij->i', loop_normals, t), np.einsum('ij,ij->i', loop_normals, b), np.einsum('ij,ij->i', loop_normals, base)), axis=1)
+    del t, b, base, loop_normals
+    if flip_y:
+        colors[:, 1] = -colors[:, 1]
+    colors = colors*0.5 + 0.5
+
+    data.calc_loop_triangles()
+    tri_loops = np.empty(len(data.loop_triangles)*3, dtype=np.int32)
+    data.loop_triangles.foreach_get("loops", tri_loops)
+    tri_loops = tri_loops.reshape(-1, 3)
+
+    pixels = np.empty((height, width, 4), dtype=np.float32)
+    pixels[:] = BAKE_BACKGROUND
+    pixels[:, :, 3] = 0.0
+    tri_uv = uv[tri_loops]
+    tri_values = colors[tri_loops]
+    workers = max(1, min(workers, height))
+    rows = np.linspace(0, height, workers+1).astype(np.int64)
+    def run(band):
+        v = tri_uv[:, :, 1]*height - 0.5
+        tris = np.flatnonzero((np.ceil(v.max(axis=1)) >= rows[band]) & (np.floor(v.min(axis=1)) < rows[band+1]))
+        rasterize_triangles(pixels, rows[band], rows[band+1], tri_uv[tris], tri_values[tris])
+
+    if workers == 1:
+        run(0)
+    else:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(run, range(workers)))
+
+    filled = pixels[:, :, 3] > 0.0
+    dilate_pixels(pixels, filled, margin)
+    pixels[:, :, 3] = 1.0
+    image.pixels.foreach_set(pixels[:, :, :image.channels].ravel())
+    image.update()
+    return len(tri_loops)
+
+#----------------------------------------------------------analysis-----------------------------------------------------
+# report of the last analysis. shown in the panel
+ANALYSIS_BINS = (0.0, 1.0, 5.0, 15.0, 30.0, 60.0, 90.0, 180.0)
+ANALYSIS_INVALID_COLOR = (1.0, 0.0, 1.0, 1.0)
+analysis = {"loops": 0}
+
+# angle in degrees between unit vectors. NaN where either is NaN
+def get_angle_array(a, b):
+    return np.degrees(np.arccos(np.clip(np.einsum('ij,ij->i', a, b), -1.0, 1.0)))
+
+# (count per bin, mean, max) of the finite angles
+def get_angle_summary(angles):
+    angles = angles[np.isfinite(angles)]
+    if len(angles) == 0:
+        return ([0]*(len(ANALYSIS_BINS)-1), 0.0, 0.0)
+    return (np.histogram(angles, bins=ANALYSIS_BINS)[0].tolist(), float(angles.mean()), float(angles.max()))
+
+# deviation 0..90 degrees from green to red. NaN and zero length loops are magenta
+def write_deviation_colors(data, name, angles):
+    attribute = data.color_attributes.get(name)
+    if attribute != None and (attribute.domain != 'CORNER' or attribute.data_type != 'FLOAT_COLOR'):
+        data.color_attributes.remove(attribute)
+        attribute = None
+    if attribute == None:
+        attribute = data.color_attributes.new(name, 'FLOAT_COLOR', 'CORNER')
+
+    colors = np.empty((len(angles), 4), dtype=np.float32)
+    colors[:] = ANALYSIS_INVALID_COLOR
+    valid = np.isfinite(angles)
+    t = np.minimum(angles[valid] / 90.0, 1.0)
+    colors[valid, 0] = t
+    colors[valid, 1] = 1.0 - t
+    colors[valid, 2] = 0.0
+    attribute.data.foreach_set("color", colors.ravel())
+
+# angles of the loop normals against the default shading normals, the face normals and a preset
+# counts NaN, zero length and back-facing (pointing away from the face) normals
+# the deviation from the default normals is written to the color attribute if given
+# require Object mode
+def analyze_normals(data, reference="", selected_only=False, attribute=""):
+    loop_normals = get_loop_normals_array(data)
+    loop_vertex = get_loop_vertex_array(data)
+    starts, totals, _ = get_polygon_arrays(data)
+    reference_normals = read_preset_normals(data, reference, loop_vertex) if reference else None
+
+    invalid = ~np.isfinite(loop_normals).all(axis=1)
+    lengths = np.sqrt(np.einsum('ij,ij->i', loop_normals, loop_normals))
+    zero = ~invalid & (lengths < 1e-6)
+    normals = normalize_array(loop_normals)
+    normals[invalid | zero] = np.nan
+
+    default_angles = get_angle_array(normals, get_default_loop_normals_array(data))
+    face_angles = get_angle_array(normals, get_polygon_normal_array(data)[get_loop_polygon_array(starts, totals)])
+    if attribute:
+        write_deviation_colors(data, attribute, default_angles)
+
+    mask = get_vertex_selection_array(data)[loop_vertex] if selected_only else np.ones(len(loop_vertex), dtype=bool)
+    analysis.clear()
+    analysis.update(loops=int(np.count_nonzero(mask)), nan=int(np.count_nonzero(invalid & mask)), zero=int(np.count_nonzero(zero & mask)),
+        back_facing=int(np.count_nonzero((face_angles > 90.0) & mask)), default=get_angle_summary(default_angles[mask]), face=get_angle_summary(face_angles[mask]))
+    if reference_normals is not None:
+        analysis["reference"] = get_angle_summary(get_angle_array(normals[mask], normalize_array(np.array(reference_normals[mask]))))
+    return analysis
+
+def format_analysis():
+    lines = ["{} loops  NaN {}  zero {}  back-facing {}".format(analysis["loops"], analysis["nan"], analysis["zero"], analysis["back_facing"])]
+    for key, label in (("default", "Default"), ("face", "Face"), ("reference", "Preset")):
+        if key in analysis:
+            counts, mean, maximum = analysis[key]
+            lines.append("{}: mean {:.1f}° max {:.1f}°".format(label, mean, maximum))
+            lines.append("  " + " ".join("<{:g}°:{}".format(edge, count) for edge, count in zip(ANALYSIS_BINS[1:], counts)))
+    return lines
+
+#----------------------------------------------------------bake cache-----------------------------------------------------
+# a cache is a .npy of shape (frames, loops, 3) written frame by frame through a memory map
+# normals are stored in rest space: the deformed result rotated by the shortest arc from the deformed
+# vertex normal to the rest vertex normal. deforming the rest mesh rotates them back when played
+BAKE_DEFAULT_DIR = "//normal_cache"
+bake_state = {"baking": False, "caches": {}, "frames": {}}
+
+def get_bake_path(ob):
+    base = bpy.context.scene.dskjal_sn_props.ne_bake_dir or BAKE_DEFAULT_DIR
+    return os.path.join(resolve_blend_path(base), bpy.path.clean_name(ob.name) + ".npy")
+
+def get_rest_path(path):
+    return path[:-4] + ".rest.npy"
+
+# deformed loop normals after the recipe
+def compute_bake_recipe(recipe, me, arrays, source_me=None, workers=1):
+    loop_vertex, selected, starts, totals, offsets, neighbours = arrays
+    normals = get_loop_normals_array(me)
+    mask = selected[loop_vertex]
+
+    if recipe == 'SMOOTH':
+        vnormals = get_vertex_normals_array(me, normals, loop_vertex)
+        indices = np.flatnonzero(selected)
+        vnormals[indices] = smooth_vertex_normals_sharded(vnormals, offsets, neighbours, indices, workers)
+        assign_loop_normals(normals, mask, lambda loops: vnormals[loop_vertex[loops]])
+    elif recipe == 'WEIGHTED':
+        vnormals = get_area_weighted_normals_array(get_vertex_co_array(me), loop_vertex, starts, totals)
+        assign_loop_normals(normals, mask, lambda loops: vnormals[loop_vertex[loops]])
+    elif recipe == 'TRANSFER':
+        # same loops: take the corner normals. same vertices: take the vertex normals
+        if len(source_me.loops) == len(normals):
+            source = get_loop_normals_array(source_me)
+            assign_loop_normals(normals, mask, lambda loops: source[loops])
+        elif len(source_me.vertices) == len(selected):
+            source = get_vertex_normal_array(source_me)
+            assign_loop_normals(normals, mask, lambda loops: source[loop_vertex[loops]])
+        else:
+            raise ValueError("Source topology does not match")
+
+    return normals
+
+# returns the number of baked frames
+# require Object mode
+def bake_normal_cache(context, ob, frame_start, frame_end, recipe, source=None, workers=1):
+    scene = context.scene
+    data = ob.data
+    path = get_bake_path(ob)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    drop_bake_cache(path)
+    # after playback wrote a cached frame into the mesh, a re-bake starts from the saved rest normals
+    # otherwise the current normals (including edits since the last bake) become the rest normals
+    if ob.get("sn_bake_played") and os.path.isfile(get_rest_path(path)):
+        restore_rest_normals(ob, path)
+    else:
+        np.save(get_rest_path(path), get_loop_normals_array(data))
+        ob["sn_bake_rest_custom"] = data.has_custom_normals
+
+    loop_vertex = get_loop_vertex_array(data)
+    rest_vnormals = get_vertex_normal_array(data)
+    starts, totals, _ = get_polygon_arrays(data)
+    offsets, neighbours = create_adjacency_array(get_edge_array(data), len(data.vertices))
+    arrays = (loop_vertex, get_vertex_selection_array(data), starts, totals, offsets, neighbours)
+    cache = np.lib.format.open_memmap(path, mode='w+', dtype=np.float32, shape=(frame_end-frame_start+1, len(loop_vertex), 3))
+
+    current = scene.frame_current
+    bake_state["baking"] = True
+    try:
+        for i, frame in enumerate(range(frame_start, frame_end+1)):
+            scene.frame_set(frame)
+            depsgraph = context.evaluated_depsgraph_get()
+            ob_eval = ob.evaluated_get(depsgraph)
+            source_eval = source.evaluated_get(depsgraph) if source != None else None
+            me = ob_eval.to_mesh()
+            source_me = source_eval.to_mesh() if source_eval != None else None
+            try:
+                if len(me.loops) != len(loop_vertex):
+                    raise ValueError("Topology changes at frame {}".format(frame))
+                normals = compute_bake_recipe(recipe, me, arrays, source_me, workers)
+                vnormals = get_vertex_normal_array(me)
+                for start, end in iter_chunks(len(loop_vertex)):
+                    lv = loop_vertex[start:end]
+                    cache[i, start:end] = normalize_array(rotate_vectors_array(normals[start:end], vnormals[lv], rest_vnormals[lv]))
+            finally:
+                ob_eval.to_mesh_clear()
+                if source_eval != None:
+                    source_eval.to_mesh_clear()
+        cache.flush()
+    finally:
+        bake_state["baking"] = False
+        del cache
+        scene.frame_set(current)
+
+    ob["sn_bake_cache"] = path
+    ob["sn_bake_frame_start"] = frame_start
+    return frame_end - frame_start + 1
+
+def drop_bake_cache(path):
+    bake_state["caches"].pop(path, None)
+    bake_state["frames"].pop(path, None)
+
+def get_bake_cache(path):
+    cache = bake_state["caches"].get(path)
+    if cache is None and os.path.isfile(path):
+        cache = np.load(path, mmap_mode='r')
+        bake_state["caches"][path] = cache
+    return cache
+
+# put the rest normals back. a mesh that had no custom normals gets its custom normals cleared
+# require Object mode
+def restore_rest_normals(ob, path):
+    rest = np.load(get_rest_path(path))
+    if not ob.get("sn_bake_rest_custom", True):
+        with bpy.context.temp_override(object=ob, active_object=ob):
+            bpy.ops.mesh.customdata_custom_splitnormals_clear()
+    elif len(rest) == len(ob.data.loops):
+        ob.data.normals_split_custom_set(rest)
+    split_normals["ready"].discard(ob.data.as_pointer())
+    ob["sn_bake_played"] = False
+
+# restore the rest normals and forget the cache
+# require Object mode
+def clear_normal_cache(ob):
+    path = ob.get("sn_bake_cache")
+    if not path:
+        return False
+    drop_bake_cache(path)
+    if os.path.isfile(get_rest_path(path)):
+        if ob.get("sn_bake_played"):
+            restore_rest_normals(ob, path)
+        os.remove(get_rest_path(path))
+    if os.path.isfile(path):
+        os.remove(path)
+    for key in ("sn_bake_cache", "sn_bake_frame_start", "sn_bake_played", "sn_bake_rest_custom"):
+        if key in ob:
+            del ob[key]
+    return True
+
+# apply the cached frame of every baked object. no recipe is evaluated here
+@bpy.app.handlers.persistent
+def bake_playback_handler(scene, *args):
+    if bake_state["baking"] or not scene.dskjal_sn_props.ne_bake_playback:
+        return
+
+    for ob in scene.objects:
+        path = ob.get("sn_bake_cache")
+        if not path or ob.type != 'MESH' or ob.mode == 'EDIT':
+            continue
+        cache = get_bake_cache(path)
+        if cache is None or cache.shape[1] != len(ob.data.loops):
+            continue
+        index = min(max(scene.frame_current - ob["sn_bake_frame_start"], 0), len(cache)-1)
+        if bake_state["frames"].get(path) == index:
+            continue
+        ob.data.normals_split_custom_set(cache[index])
+        bake_state["frames"][path] = index
+        ob["sn_bake_played"] = True
+
+#----------------------------------------------------------live smooth-----------------------------------------------------
+# depsgraph updates of the active mesh mark it dirty. the timer compares the positions with a snapshot
+# and re-smooths the moved vertices and their 1-ring, limited to vertices that were smoothed before
+# the moved vertices start from their new default normals so the result follows the new shape; the rest keep their custom normals
+LIVE_EPSILON = 1e-6
+live_state = {"key": None, "dirty": False, "co": None, "pending": None, "smoothed": None, "offsets": None, "neighbours": None, "loop_offsets": None, "loops": None}
+
+def is_live_smooth():
+    return bpy.context.scene.dskjal_sn_props.ne_live_smooth
+
+# vertex -> loops in loop order
+@memory_stage("vertex loops")
+def create_vertex_loop_array(loop_vertex, vertex_count):
+    loops = np.argsort(loop_vertex, kind='stable').astype(np.int32)
+    offsets = np.zeros(vertex_count+1, dtype=np.int64)
+    np.cumsum(np.bincount(loop_vertex, minlength=vertex_count), out=offsets[1:])
+    return offsets, loops
+
+# concatenated CSR rows of indices
+def gather_csr(offsets, values, indices):
+    counts = offsets[indices+1] - offsets[indices]
+    starts = np.repeat(offsets[indices] - np.concatenate(([0], np.cumsum(counts)[:-1])), counts)
+    return values[np.arange(counts.sum()) + starts]
+
+# rebuild the cached tables when the mesh or its topology changed
+# require Object mode data
+def live_topology(data):
+    key = (data.as_pointer(), len(data.vertices), len(data.edges), len(data.loops))
+    if live_state["key"] != key:
+        live_state["key"] = key
+        live_state["offsets"], live_state["neighbours"] = create_adjacency_array(get_edge_array(data), len(data.vertices))
+        live_state["loop_offsets"], live_state["loops"] = create_vertex_loop_array(get_loop_vertex_array(data), len(data.vertices))
+        live_state["smoothed"] = np.zeros(len(data.vertices), dtype=bool)
+        live_state["co"] = get_vertex_co_array(data)
+        live_state["pending"] = None
+
+def live_track_smoothed(ob):
+    if not is_live_smooth():
+        return
+    ob.update_from_editmode()
+    live_topology(ob.data)
+    live_state["smoothed"] |= get_vertex_selection_array(ob.data)
+    live_state["co"] = get_vertex_co_array(ob.data)
+
+@bpy.app.handlers.persistent
+def live_depsgraph_handler(scene, depsgraph):
+    if not scene.dskjal_sn_props.ne_live_smooth:
+        return
+    ob = bpy.context.view_layer.objects.active
+    if ob == None or ob.type != 'MESH':
+        return
+    for update in depsgraph.updates:
+        if update.is_updated_geometry and update.id.original in (ob, ob.data):
+            live_state["dirty"] = True
+            return
+
+# a paused grab is still running. Window.modal_operators exists since 4.2, before that only the two ticks guard
+def is_modal_running():
+    return any(len(getattr(w, "modal_operators", ())) > 0 for w in bpy.context.window_manager.windows)
+
+# called by the timer. positions must be unchanged for two ticks and no modal operator may run,
+# because switching modes frees the edit mesh under a running transform
+def live_smooth_tick(ob):
+    if not live_state["dirty"] or ob == None or ob.type != 'MESH' or ob.mode != 'EDIT' or is_modal_running():
+        return
+    ob.update_from_editmode()
+    data = ob.data
+    live_topology(data)
+
+    co = get_vertex_co_array(data)
+    moved = np.flatnonzero(np.any(np.abs(co - live_state["co"]) > LIVE_EPSILON, axis=1))
+    if len(moved) == 0:
+        live_state["dirty"] = False
+        live_state["pending"] = None
+        return
+    if live_state["pending"] is None or not np.array_equal(co, live_state["pending"]):
+        live_state["pending"] = co
+        return
+
+    live_state["dirty"] = False
+    live_state["pending"] = None
+    live_state["co"] = co
+
+    region = np.union1d(moved, gather_csr(live_state["offsets"], live_state["neighbours"], moved))
+    region = region[live_state["smoothed"][region]]
+    if len(region) == 0:
+        return
+
+    begin_stats("Live Smooth")
+    try:
+        window = bpy.context.window_manager.windows[0]
+        with bpy.context.temp_override(window=window):
+            bpy.ops.object.mode_set(mode='OBJECT')
+            try:
+                # current custom normals like the Smooth operator
+                loop_normals = get_loop_normals_array(data)
+                vnormals = get_vertex_normals_array(data, loop_normals, get_loop_vertex_array(data))
+                vnormals[moved] = get_vertex_normal_array(data)[moved]
+                smoothed = smooth_vertex_normals_array(vnormals, live_state["offsets"], live_state["neighbours"], region)
+                del vnormals
+                loops = gather_csr(live_state["loop_offsets"], live_state["loops"], region)
+                values = np.repeat(smoothed, live_state["loop_offsets"][region+1] - live_state["loop_offsets"][region], axis=0)
+                changed = count_changed_normals(loop_normals[loops], values)
+                loop_normals[loops] = values
+                commit_loop_normals(data, loop_normals, len(loops), changed)
+            finally:
+                bpy.ops.object.mode_set(mode='EDIT')
+    finally:
+        end_stats()
+
 #----------------------------------------------------show normal tools----------------------------------------------------------
 def is_same_vector(v1,v2):
     for e1,e2 in zip(v1,v2):
@@ -339,7 +2185,15 @@ def type_direction_callback(self, context):
 
     if not is_same_vector(scn.ne_type_normal, scn.ne_type_normal_old):
         if not scn.ne_update_by_global_callback:
-            set_normal_to_selected(context, v)
+            # view callbacks assign the same direction again. the write is skipped when nothing changed
+            # callbacks cannot report. a mirror error leaves the normals unchanged
+            begin_stats("Direction")
+            try:
+                set_normal_to_selected(context, v)
+            except ValueError:
+                pass
+            finally:
+                end_stats()
         scn.ne_type_normal_old = scn.ne_type_normal
 
     # update direction sphere
@@ -358,11 +2212,11 @@ def index_callback(self, context):
     index = active[0]
 
     loop_index = get_loop_index()
-    to_loops = create_loop_table(o.data)
-    if loop_index < len(to_loops[index]):
+    vertex_loops = get_vertex_loops(o.data, index)
+    if loop_index < len(vertex_loops):
         calc_normals_split(o.data)
-        loop_index = to_loops[index][loop_index]
-        context.scene.dskjal_sn_props.ne_view_normal = rot_with_view_matrix(o.data.loops[loop_index].normal, reverse=True)
+        loop_index = vertex_loops[loop_index]
+        context.scene.dskjal_sn_props.ne_view_normal = rot_with_view_matrix(get_loop_normal(o.data, loop_index), reverse=True)
 
 def view_orientation_callback(self, context):
     scn = context.scene.dskjal_sn_props
@@ -419,15 +2273,159 @@ class DSKJAL_PT_UI(bpy.types.Panel):
     row.alignment = "EXPAND"
     row.operator("smoothnormal.copy",icon="COPYDOWN")
     row.operator("smoothnormal.paste",icon="PASTEDOWN")
+    row = layout.row(align=True)
+    row.prop(scn, "ne_mirror_axis", expand=True)
+    if scn.ne_mirror_axis != 'NONE':
+        row.prop(scn, "ne_mirror_distance")
         
     #basic tools
     layout.separator()
     row = layout.row(align=True)
     row.operator("smoothnormal.smoothnormals")
     row.operator("smoothnormal.revert")
+    row = layout.row(align=True)
+    row.prop(scn, "ne_smooth_method", expand=True)
+    row = layout.row(align=True)
+    if scn.ne_smooth_method == 'BILATERAL':
+        row.prop(scn, "ne_bilateral_iterations")
+        row.prop(scn, "ne_bilateral_distance")
+        row.prop(scn, "ne_bilateral_angle")
+    else:
+        row.prop(scn, "ne_smooth_workers")
+        row.prop(scn, "ne_live_smooth", toggle=True)
     if context.scene.tool_settings.mesh_select_mode[2]:
         layout.operator("smoothnormal.setfacenormal")
 
+    row = layout.row(align=True)
+    row.operator("smoothnormal.islandnormal")
+    row.prop(scn, "ne_island_weighting", text="")
+
+    #gradient
+    layout.separator()
+    row = layout.row(align=True)
+    row.operator("smoothnormal.gradientmark", text="Mark Start").end = False
+    row.operator("smoothnormal.gradientmark", text="Mark End").end = True
+    row = layout.row()
+    row.column().prop(scn, "ne_gradient_start")
+    row.column().prop(scn, "ne_gradient_end")
+    row = layout.row(align=True)
+    row.operator("smoothnormal.gradient")
+    row.prop(scn, "ne_gradient_mode", text="")
+
+    #shape
+    layout.separator()
+    row = layout.row(align=True)
+    row.operator("smoothnormal.shapeproject")
+    row.prop(scn, "ne_shape_type", text="")
+    layout.prop(scn, "ne_shape_empty")
+    row = layout.row(align=True)
+    row.prop(scn, "ne_shape_factor")
+    row.prop_search(scn, "ne_shape_mask", ob, "vertex_groups", text="")
+
+    #normal map
+    layout.separator()
+    row = layout.row(align=True)
+    row.operator("smoothnormal.applynormalmap")
+    row.prop(scn, "ne_nmap_space", text="")
+    layout.template_ID(scn, "ne_nmap_image", open="image.open")
+    row = layout.row(align=True)
+    row.prop_search(scn, "ne_nmap_uv", ob.data, "uv_layers", text="")
+    row.prop(scn, "ne_nmap_flip_y", toggle=True)
+    row = layout.row(align=True)
+    row.operator("smoothnormal.bakenormalmap")
+    row.prop(scn, "ne_nmap_size", text="")
+    row.prop(scn, "ne_nmap_margin")
+
+    #groups
+    layout.separator()
+    row = layout.row(align=True)
+    row.operator("smoothnormal.groupnormal")
+    row.prop(scn, "ne_group_all", toggle=True)
+    row = layout.row(align=True)
+    row.prop(scn, "ne_group_source", text="")
+    row.prop(scn, "ne_group_mode", text="")
+    if scn.ne_group_source == 'ATTRIBUTE':
+        layout.prop_search(scn, "ne_group_attribute", ob.data, "attributes", text="")
+
+    #unify
+    layout.separator()
+    layout.operator("smoothnormal.unify")
+    row = layout.row(align=True)
+    row.prop(scn, "ne_unify_distance")
+    row.prop(scn, "ne_unify_weighting", text="")
+    layout.prop(scn, "ne_unify_objects", toggle=True)
+
+    #presets
+    layout.separator()
+    layout.label(text="Presets:")
+    layout.prop(scn, "ne_preset_dir", text="")
+    row = layout.row(align=True)
+    row.prop(scn, "ne_preset_name", text="")
+    row.operator("smoothnormal.savepreset", icon="FILE_TICK")
+    row = layout.row(align=True)
+    row.prop(scn, "ne_preset_selected_only", toggle=True)
+    row.prop(scn, "ne_preset_remap", toggle=True)
+    col = layout.column(align=True)
+    for name in get_preset_names(ob.data):
+        col.operator("smoothnormal.loadpreset", text=name, icon="IMPORT").preset = name
+
+    #bake cache
+    layout.separator()
+    layout.label(text="Bake Cache:")
+    layout.prop(scn, "ne_bake_dir", text="")
+    row = layout.row(align=True)
+    row.prop(scn, "ne_bake_recipe", text="")
+    if scn.ne_bake_recipe == 'TRANSFER':
+        row.prop(scn, "ne_bake_source", text="")
+    row = layout.row(align=True)
+    row.operator("smoothnormal.bakecache", icon="REC")
+    row.operator("smoothnormal.clearcache", icon="X")
+    layout.prop(scn, "ne_bake_playback", toggle=True)
+
+    #interchange
+    layout.separator()
+    row = layout.row(align=True)
+    row.operator("smoothnormal.exportnormals", icon="EXPORT")
+    row.operator("smoothnormal.importnormals", icon="IMPORT")
+
+    #select by deviation
+    layout.separator()
+    row = layout.row(align=True)
+    row.operator("smoothnormal.selectdeviation")
+    row.prop(scn, "ne_deviation_domain", text="")
+    row = layout.row(align=True)
+    row.prop(scn, "ne_deviation_reference", text="")
+    row.prop(scn, "ne_deviation_angle")
+    row.prop(scn, "ne_deviation_extend", toggle=True)
+
+    #compact
+    layout.separator()
+    row = layout.row(align=True)
+    row.operator("smoothnormal.compact")
+    row.prop(scn, "ne_compact_angle")
+
+    #analysis
+    layout.separator()
+    row = layout.row(align=True)
+    row.operator("smoothnormal.analyze")
+    row.prop(scn, "ne_analysis_selected_only", toggle=True)
+    row.prop(scn, "ne_analysis_reference", toggle=True)
+    layout.prop(scn, "ne_analysis_attribute")
+    if analysis["loops"]:
+        col = layout.column(align=True)
+        for line in format_analysis():
+            col.label(text=line)
+
+    if stats["operation"]:
+        layout.separator()
+        layout.label(text=format_stats())
+        col = layout.column(align=True)
+        for line in format_stage_stats():
+            col.label(text=line)
+    row = layout.row(align=True)
+    row.prop(scn, "ne_memory_tracking", toggle=True)
+    row.prop(scn, "ne_memory_budget")
+
 #------------------------------------------------------------------ Operator ----------------------------------------------------
 class DSKJAL_OT_SmoothButton(bpy.types.Operator):
     bl_idname = "smoothnormal.smoothnormals"
@@ -436,7 +2434,25 @@ class DSKJAL_OT_SmoothButton(bpy.types.Operator):
     def execute(self, context):
         o = bpy.context.view_layer.objects.active
     
-        smooth_selected_normals(o.data)
+        if not check_memory_budget(self):
+            return {'CANCELLED'}
+
+        scn = context.scene.dskjal_sn_props
+        begin_stats("Bilateral Smooth" if scn.ne_smooth_method == 'BILATERAL' else "Smooth")
+        try:
+            if scn.ne_smooth_method == 'BILATERAL':
+                written = smooth_bilateral_normals(o.data, scn.ne_bilateral_iterations, scn.ne_bilateral_distance, scn.ne_bilateral_angle, get_mirror())
+            else:
+                written = smooth_selected_normals(o.data, get_smooth_workers(), get_mirror())
+        except ValueError as e:
+            self.report({'ERROR'}, str(e))
+            return {'CANCELLED'}
+        finally:
+            end_stats()
+        live_track_smoothed(o)
+        if not written:
+            return {'CANCELLED'}
+
         update_active_normal(context,o)
         update_scene()
 
@@ -449,7 +2465,18 @@ class DSKJAL_OT_RevertButton(bpy.types.Operator):
     def execute(self, context):
         o = bpy.context.view_layer.objects.active
         
-        restore_selected_normals(o.data)
+        if not check_memory_budget(self):
+            return {'CANCELLED'}
+
+        begin_stats("Restore")
+        try:
+            written = restore_selected_normals(o.data)
+        finally:
+            bpy.ops.object.mode_set(mode='EDIT')
+            end_stats()
+        if not written:
+            return {'CANCELLED'}
+
         update_active_normal(context, o)
         update_scene()
 
@@ -462,12 +2489,348 @@ class DSKJAL_OT_SetFaceNormal(bpy.types.Operator):
     def execute(self, context):
         o = bpy.context.view_layer.objects.active
         
-        set_face_normal(o.data)
+        if not check_memory_budget(self):
+            return {'CANCELLED'}
+
+        begin_stats("Set Face Normal")
+        try:
+            written = set_face_normal(o.data, get_mirror())
+        except ValueError as e:
+            self.report({'ERROR'}, str(e))
+            return {'CANCELLED'}
+        finally:
+            end_stats()
+        if not written:
+            return {'CANCELLED'}
+
         update_active_normal(context, o)
         update_scene()
         
         return {'FINISHED'}
     
+class DSKJAL_OT_IslandNormal(bpy.types.Operator):
+    bl_idname = "smoothnormal.islandnormal"
+    bl_label = "Island Average"
+    bl_description = "Give every connected island of the selection its own averaged normal"
+
+    def execute(self, context):
+        o = bpy.context.view_layer.objects.active
+
+        if not check_memory_budget(self):
+            return {'CANCELLED'}
+
+        begin_stats("Island Average")
+        try:
+            written = set_island_normals(o.data, context.scene.dskjal_sn_props.ne_island_weighting)
+        finally:
+            bpy.ops.object.mode_set(mode='EDIT')
+            end_stats()
+        if not written:
+            return {'CANCELLED'}
+
+        update_active_normal(context, o)
+        update_scene()
+
+        return {'FINISHED'}
+
+class DSKJAL_OT_GradientMark(bpy.types.Operator):
+    bl_idname = "smoothnormal.gradientmark"
+    bl_label = "Mark"
+    bl_description = "Use the active vertex and its normal as an end of the gradient"
+
+    end : bpy.props.BoolProperty(default=False)
+
+    def execute(self, context):
+        scn = context.scene.dskjal_sn_props
+        o = bpy.context.view_layer.objects.active
+
+        if not check_memory_budget(self):
+            return {'CANCELLED'}
+
+        begin_stats("Mark")
+        try:
+            normal = get_active_normal(context, o)
+        finally:
+            end_stats()
+        if normal == None:
+            return {'CANCELLED'}
+        if self.end:
+            scn.ne_gradient_end = normal[0]
+            scn.ne_gradient_end_index = normal[1]
+        else:
+            scn.ne_gradient_start = normal[0]
+            scn.ne_gradient_start_index = normal[1]
+
+        return {'FINISHED'}
+
+class DSKJAL_OT_Gradient(bpy.types.Operator):
+    bl_idname = "smoothnormal.gradient"
+    bl_label = "Gradient"
+    bl_description = "Blend the selected normals from the start direction to the end direction"
+
+    def execute(self, context):
+        scn = context.scene.dskjal_sn_props
+        o = bpy.context.view_layer.objects.active
+
+        if not check_memory_budget(self):
+            return {'CANCELLED'}
+
+        begin_stats("Gradient")
+        try:
+            written = set_gradient_normals(o.data, scn.ne_gradient_start, scn.ne_gradient_end, scn.ne_gradient_start_index, scn.ne_gradient_end_index, scn.ne_gradient_mode)
+        except ValueError as e:
+            self.report({'ERROR'}, str(e))
+            return {'CANCELLED'}
+        finally:
+            end_stats()
+        if not written:
+            return {'CANCELLED'}
+
+        update_active_normal(context, o)
+        update_scene()
+
+        return {'FINISHED'}
+
+class DSKJAL_OT_ShapeProject(bpy.types.Operator):
+    bl_idname = "smoothnormal.shapeproject"
+    bl_label = "Project Shape"
+    bl_description = "Blend the selected normals toward a sphere, cylinder, capsule or plane placed by an empty"
+
+    def execute(self, context):
+        scn = context.scene.dskjal_sn_props
+        o = bpy.context.view_layer.objects.active
+        if scn.ne_shape_empty == None:
+            self.report({'ERROR'}, "Choose an empty")
+            return {'CANCELLED'}
+
+        if not check_memory_budget(self):
+            return {'CANCELLED'}
+
+        begin_stats("Project Shape")
+        try:
+            written = set_shape_normals(o, scn.ne_shape_empty, scn.ne_shape_type, scn.ne_shape_factor, scn.ne_shape_mask)
+        except ValueError as e:
+            self.report({'ERROR'}, str(e))
+            return {'CANCELLED'}
+        finally:
+            end_stats()
+        if not written:
+            return {'CANCELLED'}
+
+        update_active_normal(context, o)
+        update_scene()
+
+        return {'FINISHED'}
+
+class DSKJAL_OT_ApplyNormalMap(bpy.types.Operator):
+    bl_idname = "smoothnormal.applynormalmap"
+    bl_label = "Apply Normal Map"
+    bl_description = "Set the selected normals from a normal map sampled at their uvs"
+
+    def execute(self, context):
+        scn = context.scene.dskjal_sn_props
+        o = bpy.context.view_layer.objects.active
+        if scn.ne_nmap_image == None:
+            self.report({'ERROR'}, "Choose an image")
+            return {'CANCELLED'}
+
+        if not check_memory_budget(self):
+            return {'CANCELLED'}
+
+        begin_stats("Apply Normal Map")
+        try:
+            written = apply_normal_map(o.data, scn.ne_nmap_image, scn.ne_nmap_space, scn.ne_nmap_uv, scn.ne_nmap_flip_y)
+        except ValueError as e:
+            self.report({'ERROR'}, str(e))
+            return {'CANCELLED'}
+        finally:
+            end_stats()
+        if not written:
+            return {'CANCELLED'}
+
+        update_active_normal(context, o)
+        update_scene()
+
+        return {'FINISHED'}
+
+class DSKJAL_OT_BakeNormalMap(bpy.types.Operator):
+    bl_idname = "smoothnormal.bakenormalmap"
+    bl_label = "Bake Normal Map"
+    bl_description = "Bake the custom normals into a tangent space normal map on the CPU. A new image is made if none is chosen"
+
+    def execute(self, context):
+        scn = context.scene.dskjal_sn_props
+        o = bpy.context.view_layer.objects.active
+        if not check_memory_budget(self, extra=scn.ne_nmap_size*scn.ne_nmap_size*BUDGET_PIXEL_BYTES):
+            return {'CANCELLED'}
+        image = scn.ne_nmap_image
+        if image == None:
+            image = bpy.data.images.new(o.data.name + " Normal", scn.ne_nmap_size, scn.ne_nmap_size)
+            image.colorspace_settings.name = 'Non-Color'
+            scn.ne_nmap_image = image
+        elif tuple(image.size) != (scn.ne_nmap_size, scn.ne_nmap_size):
+            image.scale(scn.ne_nmap_size, scn.ne_nmap_size)
+
+        bpy.ops.object.mode_set(mode='OBJECT')
+        begin_stats("Bake Normal Map")
+        try:
+            triangles = bake_normal_map(o.data, image, scn.ne_nmap_uv, scn.ne_nmap_margin, scn.ne_nmap_flip_y, get_smooth_workers())
+        except ValueError as e:
+            self.report({'ERROR'}, str(e))
+            return {'CANCELLED'}
+        finally:
+            end_stats()
+            bpy.ops.object.mode_set(mode='EDIT')
+        self.report({'INFO'}, "{} triangles baked".format(triangles))
+
+        return {'FINISHED'}
+
+class DSKJAL_OT_SelectDeviation(bpy.types.Operator):
+    bl_idname = "smoothnormal.selectdeviation"
+    bl_label = "Select Deviating"
+    bl_description = "Select the vertices or faces whose normal is further than the angle from the default, the face normal or the typed direction"
+
+    def execute(self, context):
+        scn = context.scene.dskjal_sn_props
+        o = bpy.context.view_layer.objects.active
+
+        if not check_memory_budget(self):
+            return {'CANCELLED'}
+
+        begin_stats("Select Deviating")
+        try:
+            count = select_by_deviation(o.data, scn.ne_deviation_domain, scn.ne_deviation_reference, scn.ne_deviation_angle, scn.ne_type_normal, scn.ne_deviation_extend)
+        finally:
+            end_stats()
+        self.report({'INFO'}, "{} selected".format(count))
+        update_active_normal(context, o)
+
+        return {'FINISHED'}
+
+class DSKJAL_OT_CompactNormals(bpy.types.Operator):
+    bl_idname = "smoothnormal.compact"
+    bl_label = "Compact"
+    bl_description = "Remove the custom normals if they match the default shading, or store them per vertex if all corners agree"
+
+    def execute(self, context):
+        scn = context.scene.dskjal_sn_props
+        o = bpy.context.view_layer.objects.active
+
+        if not check_memory_budget(self):
+            return {'CANCELLED'}
+
+        bpy.ops.object.mode_set(mode='OBJECT')
+        begin_stats("Compact")
+        try:
+            result, saved = compact_custom_normals(o.data, scn.ne_compact_angle)
+        finally:
+            end_stats()
+            bpy.ops.object.mode_set(mode='EDIT')
+        if result == 'NONE' or result == 'KEPT':
+            self.report({'INFO'}, "Nothing to compact" if result == 'NONE' else "Custom normals are needed, kept")
+            return {'CANCELLED'}
+        self.report({'INFO'}, "{} {:.1f} KB saved".format("Cleared," if result == 'CLEARED' else "Stored per vertex,", saved/1024))
+
+        update_active_normal(context, o)
+        update_scene()
+
+        return {'FINISHED'}
+
+class DSKJAL_OT_AnalyzeNormals(bpy.types.Operator):
+    bl_idname = "smoothnormal.analyze"
+    bl_label = "Analyze"
+    bl_description = "Measure the angles of the normals against the default, the face and a preset normal and count broken normals"
+
+    def execute(self, context):
+        scn = context.scene.dskjal_sn_props
+        o = bpy.context.view_layer.objects.active
+        reference = scn.ne_preset_name if scn.ne_analysis_reference else ""
+
+        if not check_memory_budget(self):
+            return {'CANCELLED'}
+
+        bpy.ops.object.mode_set(mode='OBJECT')
+        begin_stats("Analyze")
+        try:
+            report = analyze_normals(o.data, reference, scn.ne_analysis_selected_only, scn.ne_analysis_attribute)
+        except ValueError as e:
+            self.report({'ERROR'}, str(e))
+            return {'CANCELLED'}
+        except (OSError, KeyError, zipfile.BadZipFile) as e:
+            self.report({'ERROR'}, "Cannot read preset: {}".format(e))
+            return {'CANCELLED'}
+        finally:
+            end_stats()
+            bpy.ops.object.mode_set(mode='EDIT')
+        if report["nan"] or report["zero"] or report["back_facing"]:
+            self.report({'WARNING'}, format_analysis()[0])
+        if scn.ne_analysis_attribute:
+            update_scene()
+
+        return {'FINISHED'}
+
+class DSKJAL_OT_GroupNormal(bpy.types.Operator):
+    bl_idname = "smoothnormal.groupnormal"
+    bl_label = "Group Normals"
+    bl_description = "Give every face group (material, face set or attribute) a shared normal. The direction mode uses the copied normal"
+
+    def execute(self, context):
+        scn = context.scene.dskjal_sn_props
+        o = bpy.context.view_layer.objects.active
+
+        if not check_memory_budget(self):
+            return {'CANCELLED'}
+
+        begin_stats("Group Normals")
+        try:
+            written = set_group_normals(o.data, scn.ne_group_source, scn.ne_group_mode, scn.ne_group_attribute, scn.ne_view_normal_cache, scn.ne_group_all)
+        except ValueError as e:
+            self.report({'ERROR'}, str(e))
+            return {'CANCELLED'}
+        finally:
+            end_stats()
+        if not written:
+            return {'CANCELLED'}
+
+        update_active_normal(context, o)
+        update_scene()
+
+        return {'FINISHED'}
+
+class DSKJAL_OT_UnifyCoincident(bpy.types.Operator):
+    bl_idname = "smoothnormal.unify"
+    bl_label = "Unify Coincident"
+    bl_description = "Average the normals of selected vertices at the same position across islands and objects"
+
+    def execute(self, context):
+        scn = context.scene.dskjal_sn_props
+        o = bpy.context.view_layer.objects.active
+        objects = [o]
+        if scn.ne_unify_objects:
+            objects = [ob for ob in context.objects_in_mode if ob.type == 'MESH']
+
+        if not check_memory_budget(self, objects):
+            return {'CANCELLED'}
+
+        begin_stats("Unify")
+        bpy.ops.object.mode_set(mode='OBJECT')
+        try:
+            count, written = unify_coincident_normals(objects, scn.ne_unify_distance, scn.ne_unify_weighting)
+        except ValueError as e:
+            self.report({'ERROR'}, str(e))
+            return {'CANCELLED'}
+        finally:
+            bpy.ops.object.mode_set(mode='EDIT')
+            end_stats()
+        self.report({'INFO'}, "{} vertices unified".format(count))
+        if not written:
+            return {'CANCELLED'}
+
+        update_active_normal(context, o)
+        update_scene()
+
+        return {'FINISHED'}
+
 class DSKJAL_OT_CopyButton(bpy.types.Operator):
     bl_idname = "smoothnormal.copy"
     bl_label = "Copy"
@@ -476,7 +2839,14 @@ class DSKJAL_OT_CopyButton(bpy.types.Operator):
         scn = context.scene.dskjal_sn_props
         o = bpy.context.view_layer.objects.active           
 
-        normal = get_active_normal(context, o)
+        if not check_memory_budget(self):
+            return {'CANCELLED'}
+
+        begin_stats("Copy")
+        try:
+            normal = get_active_normal(context, o)
+        finally:
+            end_stats()
         if normal != None:
             scn.ne_view_normal_cache = normal[0]
             
@@ -487,12 +2857,210 @@ class DSKJAL_OT_PasteButton(bpy.types.Operator):
     bl_label = "Paste"
     
     def execute(self, context):
-        set_normal_to_selected(context, context.scene.dskjal_sn_props.ne_view_normal_cache)
+        if not check_memory_budget(self):
+            return {'CANCELLED'}
+
+        begin_stats("Paste")
+        try:
+            written = set_normal_to_selected(context, context.scene.dskjal_sn_props.ne_view_normal_cache)
+        except ValueError as e:
+            self.report({'ERROR'}, str(e))
+            return {'CANCELLED'}
+        finally:
+            end_stats()
+        if not written:
+            return {'CANCELLED'}
+
         update_active_normal(context,context.active_object)
         update_scene()
                     
         return {'FINISHED'}
     
+class DSKJAL_OT_SavePreset(bpy.types.Operator):
+    bl_idname = "smoothnormal.savepreset"
+    bl_label = "Save"
+    bl_description = "Save the custom normals as a preset on disk"
+
+    def execute(self, context):
+        scn = context.scene.dskjal_sn_props
+        o = bpy.context.view_layer.objects.active
+        if not scn.ne_preset_name:
+            self.report({'ERROR'}, "Preset name is empty")
+            return {'CANCELLED'}
+        if not check_memory_budget(self):
+            return {'CANCELLED'}
+
+        begin_stats("Save Preset")
+        bpy.ops.object.mode_set(mode='OBJECT')
+        try:
+            count = save_normal_preset(o.data, scn.ne_preset_name, scn.ne_preset_selected_only)
+        except OSError as e:
+            self.report({'ERROR'}, "Cannot write preset: {}".format(e))
+            return {'CANCELLED'}
+        finally:
+            bpy.ops.object.mode_set(mode='EDIT')
+            end_stats()
+        self.report({'INFO'}, "{} loops saved".format(count))
+
+        return {'FINISHED'}
+
+class DSKJAL_OT_LoadPreset(bpy.types.Operator):
+    bl_idname = "smoothnormal.loadpreset"
+    bl_label = "Load Preset"
+    bl_description = "Apply a saved normal preset"
+
+    preset : bpy.props.StringProperty()
+
+    def execute(self, context):
+        o = bpy.context.view_layer.objects.active
+
+        if not check_memory_budget(self):
+            return {'CANCELLED'}
+
+        begin_stats("Load Preset")
+        bpy.ops.object.mode_set(mode='OBJECT')
+        try:
+            applied, message = load_normal_preset(o.data, self.preset, context.scene.dskjal_sn_props.ne_preset_remap)
+        except (ValueError, OSError, KeyError, zipfile.BadZipFile) as e:
+            applied, message = False, "Cannot read preset: {}".format(e)
+        finally:
+            bpy.ops.object.mode_set(mode='EDIT')
+            end_stats()
+        if not applied:
+            self.report({'ERROR'}, message)
+            return {'CANCELLED'}
+        if stats["skipped"]:
+            return {'CANCELLED'}
+
+        update_active_normal(context, o)
+        update_scene()
+
+        return {'FINISHED'}
+
+class DSKJAL_OT_ExportNormals(bpy.types.Operator, ExportHelper):
+    bl_idname = "smoothnormal.exportnormals"
+    bl_label = "Export"
+    bl_description = "Export the loop normals as raw little-endian arrays"
+
+    filename_ext = ".snrm"
+    filter_glob : bpy.props.StringProperty(default="*.snrm", options={'HIDDEN'})
+    use_position : bpy.props.BoolProperty(name="Positions", description="Write corner positions for matching by position", default=True)
+    use_uv : bpy.props.BoolProperty(name="UVs", description="Write corner uvs of the active uv map", default=True)
+
+    def execute(self, context):
+        o = bpy.context.view_layer.objects.active
+
+        if not check_memory_budget(self):
+            return {'CANCELLED'}
+
+        begin_stats("Export")
+        bpy.ops.object.mode_set(mode='OBJECT')
+        try:
+            count = export_normals(o.data, self.filepath, self.use_position, self.use_uv)
+        except OSError as e:
+            self.report({'ERROR'}, "Cannot write file: {}".format(e))
+            return {'CANCELLED'}
+        finally:
+            bpy.ops.object.mode_set(mode='EDIT')
+            end_stats()
+        self.report({'INFO'}, "{} loops exported".format(count))
+
+        return {'FINISHED'}
+
+class DSKJAL_OT_ImportNormals(bpy.types.Operator, ImportHelper):
+    bl_idname = "smoothnormal.importnormals"
+    bl_label = "Import"
+    bl_description = "Apply loop normals from a .snrm file"
+
+    filename_ext = ".snrm"
+    filter_glob : bpy.props.StringProperty(default="*.snrm", options={'HIDDEN'})
+    match : bpy.props.EnumProperty(name="Match", items=(
+        ('AUTO', "Auto", "Loop order if the topology matches, else position and uv"),
+        ('LOOP', "Loop Order", "Apply by loop index"),
+        ('POSITION', "Position + UV", "Apply by hashed corner position and uv")), default='AUTO')
+    precision : bpy.props.FloatProperty(name="Precision", description="Grid size of the position and uv hash", default=1e-4, min=1e-7, precision=6)
+
+    def execute(self, context):
+        o = bpy.context.view_layer.objects.active
+
+        if not check_memory_budget(self):
+            return {'CANCELLED'}
+
+        begin_stats("Import")
+        bpy.ops.object.mode_set(mode='OBJECT')
+        try:
+            applied, message = import_normals(o.data, self.filepath, self.match, self.precision)
+        except (ValueError, OSError) as e:
+            applied, message = False, "Cannot read file: {}".format(e)
+        finally:
+            bpy.ops.object.mode_set(mode='EDIT')
+            end_stats()
+        if not applied:
+            self.report({'ERROR'}, message)
+            return {'CANCELLED'}
+        self.report({'INFO'}, message)
+        if stats["skipped"]:
+            return {'CANCELLED'}
+
+        update_active_normal(context, o)
+        update_scene()
+
+        return {'FINISHED'}
+
+class DSKJAL_OT_BakeNormalCache(bpy.types.Operator):
+    bl_idname = "smoothnormal.bakecache"
+    bl_label = "Bake"
+    bl_description = "Apply the recipe to the deformed mesh at every frame of the scene range and cache the result"
+
+    def execute(self, context):
+        scn = context.scene.dskjal_sn_props
+        o = bpy.context.view_layer.objects.active
+        if scn.ne_bake_recipe == 'TRANSFER' and scn.ne_bake_source == None:
+            self.report({'ERROR'}, "Transfer needs a source object")
+            return {'CANCELLED'}
+        frame_count = max(context.scene.frame_end - context.scene.frame_start + 1, 0)
+        extra = frame_count*len(o.data.loops)*BUDGET_FRAME_LOOP_BYTES + estimate_memory_bytes(o.data)
+        if not check_memory_budget(self, extra=extra):
+            return {'CANCELLED'}
+
+        begin_stats("Bake Normal Cache")
+        bpy.ops.object.mode_set(mode='OBJECT')
+        try:
+            frames = bake_normal_cache(context, o, context.scene.frame_start, context.scene.frame_end, scn.ne_bake_recipe, scn.ne_bake_source, get_smooth_workers())
+        except ValueError as e:
+            self.report({'ERROR'}, str(e))
+            return {'CANCELLED'}
+        finally:
+            bpy.ops.object.mode_set(mode='EDIT')
+            end_stats()
+        self.report({'INFO'}, "{} frames baked".format(frames))
+
+        return {'FINISHED'}
+
+class DSKJAL_OT_ClearNormalCache(bpy.types.Operator):
+    bl_idname = "smoothnormal.clearcache"
+    bl_label = "Clear"
+    bl_description = "Delete the cache and restore the normals saved before baking"
+
+    def execute(self, context):
+        o = bpy.context.view_layer.objects.active
+
+        if not check_memory_budget(self):
+            return {'CANCELLED'}
+
+        begin_stats("Clear Normal Cache")
+        bpy.ops.object.mode_set(mode='OBJECT')
+        try:
+            cleared = clear_normal_cache(o)
+        finally:
+            bpy.ops.object.mode_set(mode='EDIT')
+            end_stats()
+        if not cleared:
+            return {'CANCELLED'}
+        update_scene()
+
+        return {'FINISHED'}
+
 def is_normal_active(ob):
     if not getattr(ob,'mode', False) or ob.mode != 'EDIT':
         return False
@@ -508,6 +3076,13 @@ def global_callback_handler():
     interval = 0.5
     ob = bpy.context.view_layer.objects.active
     scn = bpy.context.scene.dskjal_sn_props
+    if scn.ne_live_smooth:
+        # an exception would unregister the timer and stop the view sync as well
+        try:
+            live_smooth_tick(ob)
+        except Exception:
+            traceback.print_exc()
+
     if is_normal_active(ob):
         new_rotation = get_window_rotation()
         if new_rotation == None:
@@ -531,6 +3106,10 @@ def global_callback_handler():
     return interval
 
 #------------------------------------------- Register ----------------------------------------------------------
+WEIGHTING_ITEMS = (
+    ('EQUAL', "Equal", "Mean of the current normals"),
+    ('AREA', "Area", "Area weighted face normals"))
+
 class DSKJAL_SN_Props(bpy.types.PropertyGroup):
     #for cache
     ne_view_normal_cache : bpy.props.FloatVectorProperty(name="", subtype='XYZ', min=-1, max=1)
@@ -547,6 +3126,113 @@ class DSKJAL_SN_Props(bpy.types.PropertyGroup):
     ne_view_normal : bpy.props.FloatVectorProperty(name="",default=(1,0,0),subtype='DIRECTION',update=view_normal_callback)
     ne_type_normal : bpy.props.FloatVectorProperty(name="",subtype='XYZ',update=type_direction_callback)
     ne_update_by_global_callback : bpy.props.BoolProperty(name="Split Mode",default=True)
+
+    #for mirror
+    ne_mirror_axis : bpy.props.EnumProperty(name="Mirror",description="Mirror the edits of Smooth, Set Face Normal, Paste and the direction to the other side",items=(
+        ('NONE', "Off", "No mirror"),
+        ('X', "X", "Mirror across the local YZ plane"),
+        ('Y', "Y", "Mirror across the local XZ plane"),
+        ('Z', "Z", "Mirror across the local XY plane")),default='NONE')
+    ne_mirror_distance : bpy.props.FloatProperty(name="Distance",description="Vertices closer than this to the mirrored position are mirror pairs",default=1e-4,min=1e-6,precision=5,subtype='DISTANCE')
+
+    #for smooth
+    ne_smooth_method : bpy.props.EnumProperty(name="Method",items=(
+        ('UNIFORM', "Uniform", "Mean of the vertex and its neighbours"),
+        ('BILATERAL', "Bilateral", "Neighbours weighted by distance and normal angle. Keeps creases")),default='UNIFORM')
+    ne_bilateral_iterations : bpy.props.IntProperty(name="Iterations",default=3,min=1,max=100)
+    ne_bilateral_distance : bpy.props.FloatProperty(name="Distance",description="Spatial sigma relative to the mean edge length",default=1.0,min=0.01,max=100.0)
+    ne_bilateral_angle : bpy.props.FloatProperty(name="Angle",description="Normals that differ more than this barely contribute",default=math.radians(30),min=math.radians(1),max=math.pi,subtype='ANGLE')
+    ne_smooth_workers : bpy.props.IntProperty(name="Workers",description="Number of threads used by Smooth. Results do not depend on it",default=1,min=1,max=64)
+    ne_live_smooth : bpy.props.BoolProperty(name="Live",description="Re-smooth smoothed vertices and their neighbours after they are moved",default=False)
+
+    #for unify
+    ne_unify_distance : bpy.props.FloatProperty(name="Distance",description="Vertices closer than this share a normal",default=1e-4,min=1e-6,precision=5,subtype='DISTANCE')
+    ne_unify_objects : bpy.props.BoolProperty(name="Across Objects",description="Include all meshes in Edit mode",default=False)
+    ne_unify_weighting : bpy.props.EnumProperty(name="Weighting", items=WEIGHTING_ITEMS, default='EQUAL')
+
+    #for island average
+    ne_island_weighting : bpy.props.EnumProperty(name="Weighting", items=WEIGHTING_ITEMS, default='EQUAL')
+
+    #for gradient
+    ne_gradient_start : bpy.props.FloatVectorProperty(name="Start",default=(0,0,1),subtype='XYZ')
+    ne_gradient_end : bpy.props.FloatVectorProperty(name="End",default=(0,0,1),subtype='XYZ')
+    ne_gradient_start_index : bpy.props.IntProperty(default=-1)
+    ne_gradient_end_index : bpy.props.IntProperty(default=-1)
+    ne_gradient_mode : bpy.props.EnumProperty(name="Distance", items=(
+        ('AXIS', "Axis", "Projection on the line between the marked vertices"),
+        ('GEODESIC', "Geodesic", "Path length over the selected edges"),
+        ('EDGE_RING', "Edge Rings", "Number of edges from the marked vertices")), default='AXIS')
+
+    #for shape projection
+    ne_shape_type : bpy.props.EnumProperty(name="Shape", items=(
+        ('SPHERE', "Sphere", "Radial from the empty"),
+        ('CYLINDER', "Cylinder", "Radial around the local Z axis of the empty"),
+        ('CAPSULE', "Capsule", "From the local Z segment -1 to 1 of the empty"),
+        ('PLANE', "Plane", "Local Z axis of the empty")), default='SPHERE')
+    ne_shape_empty : bpy.props.PointerProperty(name="Empty",type=bpy.types.Object,poll=lambda self, ob: ob.type == 'EMPTY')
+    ne_shape_factor : bpy.props.FloatProperty(name="Factor",default=1.0,min=0.0,max=1.0,subtype='FACTOR')
+    ne_shape_mask : bpy.props.StringProperty(name="Mask",description="Vertex group or float point attribute used as weight")
+
+    #for normal map
+    ne_nmap_image : bpy.props.PointerProperty(name="Image",type=bpy.types.Image)
+    ne_nmap_space : bpy.props.EnumProperty(name="Space", items=(
+        ('TANGENT', "Tangent", "Relative to the default shading normals and the tangents of the uv map"),
+        ('OBJECT', "Object", "Object space normals")), default='TANGENT')
+    ne_nmap_uv : bpy.props.StringProperty(name="UV Map",description="Empty for the active uv map")
+    ne_nmap_flip_y : bpy.props.BoolProperty(name="Flip Y",default=False,description="DirectX normal map (-Y green)")
+    ne_nmap_size : bpy.props.IntProperty(name="Size",default=1024,min=8,max=16384,description="Width and height of the baked image")
+    ne_nmap_margin : bpy.props.IntProperty(name="Margin",default=2,min=0,max=64,description="Pixels filled around the uv islands")
+
+    #for select by deviation
+    ne_deviation_domain : bpy.props.EnumProperty(name="Domain", items=(
+        ('VERTEX', "Vertices", "Select vertices with a deviating corner"),
+        ('FACE', "Faces", "Select faces with a deviating corner")), default='VERTEX')
+    ne_deviation_reference : bpy.props.EnumProperty(name="Reference", items=(
+        ('DEFAULT', "Default", "Default shading normals"),
+        ('FACE', "Face", "Face normals"),
+        ('DIRECTION', "Direction", "The typed direction")), default='DEFAULT')
+    ne_deviation_angle : bpy.props.FloatProperty(name="Angle",default=math.radians(10.0),min=0.0,max=math.pi,subtype='ANGLE')
+    ne_deviation_extend : bpy.props.BoolProperty(name="Extend",description="Add to the selection",default=False)
+
+    #for memory accounting
+    ne_memory_tracking : bpy.props.BoolProperty(name="Track Memory",description="Record the peak allocation of each operator and its stages (slower)",default=False)
+    ne_memory_budget : bpy.props.IntProperty(name="Budget MB",description="Refuse edits estimated to need more memory. 0 for no limit",default=0,min=0)
+
+    #for compact
+    ne_compact_angle : bpy.props.FloatProperty(name="Tolerance",default=CHANGE_EPSILON,min=0.0,max=math.radians(10.0),subtype='ANGLE',description="Normals closer than this are treated as equal")
+
+    #for analysis
+    ne_analysis_selected_only : bpy.props.BoolProperty(name="Selected Only",description="Count only the loops of the selected vertices",default=False)
+    ne_analysis_reference : bpy.props.BoolProperty(name="Preset",description="Also compare with the preset named in Presets",default=False)
+    ne_analysis_attribute : bpy.props.StringProperty(name="Color",description="Write the deviation from the default normals to this color attribute. Empty to skip")
+
+    #for group normals
+    ne_group_source : bpy.props.EnumProperty(name="Group By", items=(
+        ('MATERIAL', "Material", "Material index"),
+        ('FACE_SET', "Face Set", "Sculpt face sets"),
+        ('FACE_MAP', "Face Map", "Active face map (before Blender 4.0)"),
+        ('ATTRIBUTE', "Attribute", "Integer, boolean or float face attribute")), default='MATERIAL')
+    ne_group_attribute : bpy.props.StringProperty(name="Attribute")
+    ne_group_mode : bpy.props.EnumProperty(name="Normal", items=(
+        ('AVERAGE', "Average", "Mean of the loop normals of the group"),
+        ('AREA', "Area Weighted", "Area weighted face normals of the group"),
+        ('DIRECTION', "Copied Direction", "The copied normal")), default='AVERAGE')
+    ne_group_all : bpy.props.BoolProperty(name="All Groups",description="Change every group, not only the groups with a selected face",default=False)
+
+    #for presets
+    ne_preset_dir : bpy.props.StringProperty(name="Preset Folder",default=PRESET_DEFAULT_DIR,subtype='DIR_PATH')
+    ne_preset_name : bpy.props.StringProperty(name="Preset Name",default="preset")
+    ne_preset_selected_only : bpy.props.BoolProperty(name="Selected Only",description="Save only the loops of the selected vertices",default=False)
+    ne_preset_remap : bpy.props.BoolProperty(name="Remap",description="Map presets of a different topology by vertex index",default=False)
+
+    #for bake cache
+    ne_bake_dir : bpy.props.StringProperty(name="Cache Folder",default=BAKE_DEFAULT_DIR,subtype='DIR_PATH')
+    ne_bake_recipe : bpy.props.EnumProperty(name="Recipe", items=(
+        ('SMOOTH', "Smooth", "Smooth the selected vertices of the deformed mesh"),
+        ('WEIGHTED', "Face Weighted", "Area weighted normals of the deformed mesh for the selected vertices"),
+        ('TRANSFER', "Transfer", "Normals of the deformed source object by loop or vertex index")), default='SMOOTH')
+    ne_bake_source : bpy.props.PointerProperty(name="Source",type=bpy.types.Object,poll=lambda self, ob: ob.type == 'MESH')
+    ne_bake_playback : bpy.props.BoolProperty(name="Play Cache",description="Apply the cached normals on frame change in Object mode",default=False)
         
 class Handler_Class:
     __handle = None
@@ -566,8 +3252,25 @@ classes = (
     DSKJAL_OT_SmoothButton,
     DSKJAL_OT_RevertButton,
     DSKJAL_OT_SetFaceNormal,
+    DSKJAL_OT_IslandNormal,
+    DSKJAL_OT_GradientMark,
+    DSKJAL_OT_Gradient,
+    DSKJAL_OT_ShapeProject,
+    DSKJAL_OT_ApplyNormalMap,
+    DSKJAL_OT_BakeNormalMap,
+    DSKJAL_OT_SelectDeviation,
+    DSKJAL_OT_CompactNormals,
+    DSKJAL_OT_AnalyzeNormals,
+    DSKJAL_OT_GroupNormal,
+    DSKJAL_OT_UnifyCoincident,
     DSKJAL_OT_CopyButton,
     DSKJAL_OT_PasteButton,
+    DSKJAL_OT_SavePreset,
+    DSKJAL_OT_LoadPreset,
+    DSKJAL_OT_ExportNormals,
+    DSKJAL_OT_ImportNormals,
+    DSKJAL_OT_BakeNormalCache,
+    DSKJAL_OT_ClearNormalCache,
     DSKJAL_SN_Props
 )
 
@@ -577,16 +3280,247 @@ def register():
 
     bpy.types.Scene.dskjal_sn_props = bpy.props.PointerProperty(type=DSKJAL_SN_Props)
     bpy.app.timers.register(global_callback_handler, persistent=True)
+    bpy.app.handlers.frame_change_post.append(bake_playback_handler)
+    bpy.app.handlers.depsgraph_update_post.append(live_depsgraph_handler)
     Handler_Class.add_handle()
 
 def unregister():
     Handler_Class.remove_handle()
     bpy.app.timers.unregister(global_callback_handler)
+    if bake_playback_handler in bpy.app.handlers.frame_change_post:
+        bpy.app.handlers.frame_change_post.remove(bake_playback_handler)
+    if live_depsgraph_handler in bpy.app.handlers.depsgraph_update_post:
+        bpy.app.handlers.depsgraph_update_post.remove(live_depsgraph_handler)
     if getattr(bpy.types.Scene, "dskjal_sn_props", False): del bpy.types.Scene.dskjal_sn_props
 
     for cls in reversed(classes):
         bpy.utils.unregister_class(cls)
 
-    
+#------------------------------------------- Batch ----------------------------------------------------------
+# blender -b --python smooth-normal-420.py -- --files "assets/*.blend" --operation SMOOTH --iterations 3 --jobs 4 --report report.json
+BATCH_OPERATIONS = ('SMOOTH', 'BILATERAL', 'RESTORE', 'FACE', 'FACE_WEIGHTED', 'DIRECTION', 'BENCHMARK')
+
+def parse_batch_args(argv):
+    parser = argparse.ArgumentParser(prog="smooth-normal", description="Apply a normal recipe to many .blend files")
+    parser.add_argument("--files", nargs="+", default=[], help="blend files or glob patterns")
+    parser.add_argument("--file-list", default="", help="text file with one blend path per line")
+    parser.add_argument("--object", default="*", help="object name pattern")
+    parser.add_argument("--vertex-group", default="", help="edit only the vertices of this vertex group")
+    parser.add_argument("--selection", action="store_true", help="edit only the vertices selected in the file")
+    parser.add_argument("--operation", choices=BATCH_OPERATIONS, default='SMOOTH')
+    parser.add_argument("--iterations", type=int, default=1)
+    parser.add_argument("--workers", type=int, default=1, help="threads per smooth")
+    parser.add_argument("--sigma-distance", type=float, default=1.0, help="bilateral spatial sigma relative to the mean edge length")
+    parser.add_argument("--sigma-angle", type=float, default=30.0, help="bilateral normal angle sigma in degrees")
+    parser.add_argument("--benchmark-workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--direction", type=float, nargs=3, default=(0.0, 0.0, 1.0))
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--output-dir", default="", help="save results here instead of overwriting the files")
+    parser.add_argument("--dry-run", action="store_true", help="do not save the files")
+    parser.add_argument("--report", default="", help="json report path. stdout if empty")
+    parser.add_argument("--worker-report", default="", help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+def expand_batch_files(args):
+    patterns = list(args.files)
+    if args.file_list:
+        with open(args.file_list) as f:
+            patterns += [line.strip() for line in f if line.strip()]
+
+    files = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern, recursive=True)) if glob.has_magic(pattern) else [pattern]
+        for m in matches:
+            m = os.path.abspath(m)
+            if m not in files:
+                files.append(m)
+    return files
+
+# require Object mode
+def select_batch_vertices(ob, args):
+    data = ob.data
+    if args.vertex_group:
+        weights = get_vertex_weight_array(ob, args.vertex_group)
+        if weights is None:
+            return 0
+        selected = weights > 0.0
+    elif not args.selection:
+        selected = np.ones(len(data.vertices), dtype=bool)
+    else:
+        selected = get_vertex_selection_array(data)
+
+    set_selection_arrays(data, selected)
+    return int(np.count_nonzero(selected))
+
+# returns the changed loops and skip state of each pass. only SMOOTH runs several passes
+def apply_batch_operation(ob, args):
+    passes = []
+    for i in range(max(args.iterations, 1) if args.operation == 'SMOOTH' else 1):
+        begin_stats(args.operation)
+        try:
+            apply_batch_pass(ob, args)
+        finally:
+            end_stats()
+        passes.append({"changed_loops": stats["changed_loops"], "skipped": stats["skipped"]})
+    return passes
+
+def apply_batch_pass(ob, args):
+    data = ob.data
+    if args.operation == 'SMOOTH':
+        smooth_selected_normals(data, args.workers)
+    elif args.operation == 'BILATERAL':
+        smooth_bilateral_normals(data, max(args.iterations, 1), args.sigma_distance, math.radians(args.sigma_angle))
+    elif args.operation == 'RESTORE':
+        restore_selected_normals(data)
+    elif args.operation == 'FACE':
+        set_face_normal(data)
+    elif args.operation == 'FACE_WEIGHTED':
+        # the built-in operator writes the normals itself, so the stats compare the loop normals before and after
+        bpy.ops.object.mode_set(mode='OBJECT')
+        before = get_loop_normals_array(data)
+        bpy.ops.object.mode_set(mode='EDIT')
+        bpy.ops.mesh.average_normals(average_type='FACE_AREA')
+        bpy.ops.object.mode_set(mode='OBJECT')
+        changed = count_changed_normals(before, get_loop_normals_array(data))
+        stats["loops"] += int(np.count_nonzero(get_vertex_selection_array(data)[get_loop_vertex_array(data)]))
+        stats["changed_loops"] += changed
+        stats["buffer_bytes"] = max(stats["buffer_bytes"], before.nbytes)
+        stats["skipped"] = changed == 0
+        if changed:
+            split_normals["ready"].discard(data.as_pointer())
+        del before
+        bpy.ops.object.mode_set(mode='EDIT')
+    elif args.operation == 'DIRECTION':
+        normal = mathutils.Vector(args.direction)
+        normal.normalize()
+        set_same_normal(data, normal)
+
+# runs inside the blender instance that opened the file
+def run_batch_worker(args):
+    report = {"file": bpy.data.filepath, "operation": args.operation, "objects": []}
+    start = time.perf_counter()
+
+    targets = [o for o in bpy.context.scene.objects if o.type == 'MESH' and fnmatch.fnmatchcase(o.name, args.object)]
+    for o in targets:
+        if o.data.users > 1 and any(r["mesh"] == o.data.name for r in report["objects"]):
+            continue
+        ob_start = time.perf_counter()
+        if bpy.context.object and bpy.context.object.mode != 'OBJECT':
+            bpy.ops.object.mode_set(mode='OBJECT')
+        bpy.context.view_layer.objects.active = o
+        selected = select_batch_vertices(o, args)
+        record = {
+            "name": o.name,
+            "mesh": o.data.name,
+            "vertices": len(o.data.vertices),
+            "loops": len(o.data.loops),
+            "selected_vertices": selected
+        }
+        if args.operation == 'BENCHMARK':
+            record["benchmark"] = benchmark_sharded_smooth(o.data, args.benchmark_workers)
+            record["normal_read"] = benchmark_normal_reads(o.data)
+        elif selected > 0:
+            bpy.ops.object.mode_set(mode='EDIT')
+            passes = apply_batch_operation(o, args)
+            bpy.ops.object.mode_set(mode='OBJECT')
+            # a loop changed by several passes counts once at most, so the total is capped at the loop count
+            record["passes"] = passes
+            record["changed_loops"] = min(sum(p["changed_loops"] for p in passes), record["loops"])
+            record["skipped"] = all(p["skipped"] for p in passes)
+
+        record["seconds"] = time.perf_counter() - ob_start
+        report["objects"].append(record)
+
+    if not args.dry_run and args.operation != 'BENCHMARK':
+        if args.output_dir:
+            os.makedirs(args.output_dir, exist_ok=True)
+            path = os.path.join(args.output_dir, os.path.basename(bpy.data.filepath))
+            bpy.ops.wm.save_as_mainfile(filepath=path, copy=True)
+            report["saved"] = path
+        else:
+            bpy.ops.wm.save_mainfile()
+            report["saved"] = bpy.data.filepath
+
+    report["loops"] = sum(r["loops"] for r in report["objects"])
+    report["seconds"] = time.perf_counter() - start
+    with open(args.worker_report, "w") as f:
+        json.dump(report, f, indent=2)
+
+# worker_report is a path in a temporary folder. a stale report must never be read as the result of a crashed worker
+def run_batch_file(path, argv, worker_report):
+    if os.path.exists(worker_report):
+        os.remove(worker_report)
+    cmd = [bpy.app.binary_path, "-b", "--factory-startup", path, "--python-exit-code", "1", "--python", os.path.abspath(__file__), "--"] + argv + ["--worker-report", worker_report]
+    start = time.perf_counter()
+    proc = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True)
+
+    report = {"file": path}
+    try:
+        with open(worker_report) as f:
+            report = json.load(f)
+    except (OSError, ValueError):
+        report["error"] = proc.stdout[-2000:]
+    finally:
+        if os.path.exists(worker_report):
+            os.remove(worker_report)
+
+    report["returncode"] = proc.returncode
+    report["process_seconds"] = time.perf_counter() - start
+    report["status"] = "ok" if proc.returncode == 0 and "error" not in report else "error"
+    return report
+
+# runs in the controlling blender instance and fans the files out to background instances
+def run_batch(args, argv):
+    files = expand_batch_files(args)
+    start = time.perf_counter()
+    jobs = max(1, min(args.jobs, len(files)))
+
+    # strip the file arguments. each worker gets exactly one file
+    worker_argv = []
+    skip = False
+    for a in argv:
+        if a in ("--files", "--file-list", "--report", "--jobs"):
+            skip = True
+            continue
+        if skip and not a.startswith("--"):
+            continue
+        skip = False
+        worker_argv.append(a)
+
+    # one report per file index, so files with the same name in different folders do not collide
+    report_dir = tempfile.mkdtemp(prefix="smooth_normal_")
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as pool:
+            reports = list(pool.map(lambda i: run_batch_file(files[i], worker_argv, os.path.join(report_dir, "{}.json".format(i))), range(len(files))))
+    finally:
+        shutil.rmtree(report_dir, ignore_errors=True)
+
+    summary = {
+        "operation": args.operation,
+        "jobs": jobs,
+        "files": reports,
+        "failed": sum(1 for r in reports if r["status"] != "ok"),
+        "loops": sum(r.get("loops", 0) for r in reports),
+        "seconds": time.perf_counter() - start
+    }
+    text = json.dumps(summary, indent=2)
+    if args.report:
+        with open(args.report, "w") as f:
+            f.write(text)
+    else:
+        print(text)
+
+    return summary["failed"]
+
+def batch_main():
+    argv = sys.argv[sys.argv.index("--") + 1:]
+    args = parse_batch_args(argv)
+    if args.worker_report:
+        run_batch_worker(args)
+        return 0
+    return run_batch(args, argv)
+
 if __name__ == "__main__":
+    if bpy.app.background and "--" in sys.argv:
+        sys.exit(batch_main())
     register()